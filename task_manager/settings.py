@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the queries other middleware run (sessions, the user) are counted too
+    'tasks.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +75,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'tasks.context_processors.timezone_form',
+                'tasks.context_processors.unread_notifications',
             ],
         },
     },
@@ -176,3 +179,31 @@ REDIRECT_URL_WHEN_LOGGED_IN = 'dashboard'
 MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
+
+# Task search engine, 'postgresql' or 'memory' (in-process index); picked from the database vendor when None
+TASK_SEARCH_ENGINE = None
+
+# Per-request query counts, DB time and repeated query shapes in a Server-Timing header and the tasks.queries log
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', '') == '1'
+# Raise instead of logging a warning when a view runs more queries than its query_budget
+QUERY_BUDGET_STRICT = False
+
+# 'immediate' writes notifications during the request; 'outbox' queues them for "manage.py notification_worker"
+NOTIFICATION_DELIVERY = os.environ.get('NOTIFICATION_DELIVERY', 'immediate')
+# Seconds within which repeated notifications about the same task are merged into one
+NOTIFICATION_COALESCE_WINDOW = 3600
+# Notification kinds held for "manage.py notification_digest" instead of being delivered one by one, e.g. ['task_modified']
+NOTIFICATION_DIGEST_KINDS = []
+# Age in days past which "manage.py prune_notifications" moves notifications to the archive
+NOTIFICATION_RETENTION_DAYS = 90
+# Longest time in seconds a user's dashboard task lists are cached for; they are dropped sooner when one of
+# their tasks changes or falls due
+DASHBOARD_CACHE_TIMEOUT = 3600
+# Most users returned by the user search behind the team member pickers
+USER_SEARCH_RESULTS = 10
+# Seconds a live notification stream waits before checking the database for notifications written by other processes;
+# under WSGI, where streams are not held open, the seconds between the browser's polls instead
+NOTIFICATION_STREAM_POLL_INTERVAL = 15
+# Seconds before a live notification stream is ended for the browser to reconnect, so streams of clients that
+# have gone away do not pile up
+NOTIFICATION_STREAM_MAX_AGE = 300
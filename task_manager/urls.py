@@ -36,13 +36,18 @@ urlpatterns = [
     path('tasks/<int:pk>', views.TaskDetailView.as_view(), name='task_detail'),
     path('tasks/<int:pk>/modify', views.ModifyTaskView.as_view(), name='modify_task'),
     path('tasks/<int:pk>/delete', views.DeleteTaskView.as_view(), name='delete_task'),
+    path('users/search', views.user_search, name='user_search'),
     path('teams/', views.TeamListView.as_view(), name='team_list'),
-    path('teams/<str:team_name>/delete', views.DeleteTeamView.as_view(), name='delete_team'),
+    path('teams/<slug:slug>/delete', views.DeleteTeamView.as_view(), name='delete_team'),
     path('timelogging/<int:pk>/', views.TaskDetailView.as_view(), name='time_logging'),
-    path('teams/<str:team_name>', views.TeamDetailView.as_view(), name='team_detail'),
+    path('teams/<slug:slug>', views.TeamDetailView.as_view(), name='team_detail'),
     path('timeline/', views.TimelineView.as_view(), name='timeline'),
+    path('timeline/feed', views.TimelineFeedView.as_view(), name='timeline_feed'),
     path('timeline/<int:year>/', views.TimelineYearView.as_view(), name='timeline_year'),
     path('timeline/<int:year>/<int:month>/', views.TimelineMonthView.as_view(), name='timeline_month'),
+    path('calendar/<str:token>.ics', views.CalendarFeedView.as_view(), name='calendar_feed'),
+    path('calendar/revoke', views.RevokeCalendarFeedView.as_view(), name='revoke_calendar_feed'),
     path('timezone', views.timezone_select, name='timezone'),
     path('Inbox', views.InboxPageView.as_view(), name='inbox'),
+    path('Inbox/stream', views.notification_stream, name='notification_stream'),
 ]
\ No newline at end of file
@@ -10,3 +10,11 @@ def timezone_form(request):
     else:
         form = TimezoneForm({'timezone' : 'UTC'})
     return {'timezone_form' : form}
+
+
+def unread_notifications(request):
+    """Gives the user's unread notification count to every view, from the counter kept on the user"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notification_count': user.unread_notifications}
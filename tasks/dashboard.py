@@ -0,0 +1,84 @@
+"""Per-user caching of the dashboard task lists for the tasks app"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from tasks.models import Task, TaskParticipant
+
+# Tasks shown in each of the dashboard's lists
+DASHBOARD_TASKS = 10
+MEMBER_ROLES = [TaskParticipant.Role.MEMBER, TaskParticipant.Role.BOTH]
+
+
+def _version_key(user_id):
+    return f'dashboard:version:{user_id}'
+
+
+def _new_version():
+    """Returns a version number no earlier entry can have, even if the user's last version was evicted"""
+    return time.time_ns()
+
+
+def dashboard_version(user_id):
+    """Returns the current version of the user's cached dashboard, starting a new one if there is none"""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump(user_ids):
+    version = _new_version()
+    cache.set_many({_version_key(user_id): version for user_id in user_ids}, timeout=None)
+
+
+def invalidate_dashboards(user_ids):
+    """Moves the users to a new dashboard version, so their cached task lists are no longer used.
+
+    Done straight away and again once the current transaction commits, so that lists read by another
+    request before the commit are not kept."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    _bump(user_ids)
+    transaction.on_commit(lambda: _bump(user_ids))
+
+
+def load_dashboard_tasks(user, now):
+    """Returns the user's next tasks and overdue tasks, each a range of the participants' (user, deadline) index"""
+    # Each range goes in a single filter() call, so it is a condition on the same participant row
+    upcoming = Task.objects.filter(participants__user=user, participants__role__in=MEMBER_ROLES,
+                                   participants__deadline__gte=now).order_by('participants__deadline')
+    overdue = Task.objects.filter(participants__user=user, participants__role__in=MEMBER_ROLES,
+                                  participants__deadline__lt=now).order_by('participants__deadline')
+    upcoming, overdue = list(upcoming[:DASHBOARD_TASKS]), list(overdue[:DASHBOARD_TASKS])
+    return upcoming, overdue
+
+
+def dashboard_tasks(user):
+    """Returns the user's next tasks and overdue tasks, from the cache when none of their tasks has changed.
+
+    Entries hold until the first upcoming task falls due and moves to the overdue list, or for
+    DASHBOARD_CACHE_TIMEOUT seconds at most."""
+    now = timezone.now()
+    key = f'dashboard:tasks:{user.pk}:{dashboard_version(user.pk)}'
+    cached = cache.get(key)
+    # Backends round timeouts to whole seconds, so check the boundary as well
+    if cached is not None and now < cached[0]:
+        return cached[1], cached[2]
+
+    upcoming, overdue = load_dashboard_tasks(user, now)
+    expires = now + timedelta(seconds=getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 3600))
+    if upcoming:
+        expires = min(expires, upcoming[0].deadline)
+    timeout = (expires - now).total_seconds()
+    if timeout > 0:
+        cache.set(key, (expires, upcoming, overdue), int(timeout) + 1)
+    return upcoming, overdue
@@ -4,7 +4,9 @@ from django import forms
 from django.contrib.auth import authenticate
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import urlencode
 from .models import User, Task, Team, TimeLogging
 
 
@@ -34,6 +36,14 @@ class UserForm(forms.ModelForm):
         model = User
         fields = ['first_name', 'last_name', 'username', 'email']
 
+    def save(self, commit=True):
+        """Save only the profile fields, leaving the unread counter to its atomic updates."""
+
+        user = super().save(commit=False)
+        if commit:
+            user.save(update_fields=self._meta.fields)
+        return user
+
 
 class NewPasswordMixin(forms.Form):
     """Form mixing for new_password and password_confirmation fields."""
@@ -88,7 +98,7 @@ class PasswordForm(NewPasswordMixin):
         new_password = self.cleaned_data['new_password']
         if self.user is not None:
             self.user.set_password(new_password)
-            self.user.save()
+            self.user.save(update_fields=['password'])
         return self.user
 
 
@@ -176,9 +186,11 @@ class CreateTaskForm2(forms.ModelForm):
         self.team = team
 
         if self.team is not None:
+            # Only the team's members are valid choices, so cleaning the field checks membership in one query
             self.fields['members'] = forms.ModelMultipleChoiceField(
                 queryset=team.team_members.all(),
-                widget=forms.CheckboxSelectMultiple(attrs={"class": "form-check form-check-inline"}))
+                widget=forms.CheckboxSelectMultiple(attrs={"class": "form-check form-check-inline"}),
+                error_messages={'invalid_choice': "Members must be in the specified team!"})
         else:
             self.fields['members'] = forms.ModelMultipleChoiceField(
                 queryset=User.objects.none(),
@@ -198,14 +210,31 @@ class CreateTaskForm2(forms.ModelForm):
 
         """Ensures at least one team member is selected"""
         members = self.cleaned_data.get('members')
-        if members is None:
+        if members is None and not self.has_error('members', 'invalid_choice'):
             self.add_error('members', "Select at least one team member!")
-        else:
-            """Checks if all members chosen are in the selected team"""
-            for member in members:
-                if not self.team in member.teams.all():
-                    self.add_error('members', "Members must be in the specified team!")
-                    break
+
+
+class UserSearchWidget(forms.SelectMultiple):
+    """Picks users by username through the user search endpoint, rendering only those already picked
+    rather than every user."""
+    template_name = 'widgets/user_search.html'
+
+    def __init__(self, attrs=None, team=None):
+        super().__init__(attrs)
+        self.team = team
+
+    def optgroups(self, name, value, attrs=None):
+        """Lists the picked usernames without loading the choices"""
+        return [(None, [self.create_option(name, username, username, True, index)], index)
+                for index, username in enumerate(value)]
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        search_url = reverse('user_search')
+        if self.team is not None:
+            search_url += '?' + urlencode({'team': self.team.slug})
+        context['widget']['search_url'] = search_url
+        return context
 
 
 class TeamCreateForm(forms.ModelForm):
@@ -221,7 +250,7 @@ class TeamCreateForm(forms.ModelForm):
     team_members = forms.ModelMultipleChoiceField(
         queryset=User.objects.all(),
         to_field_name='username',
-        widget=forms.CheckboxSelectMultiple,
+        widget=UserSearchWidget,
         required=True
     )
 
@@ -268,6 +297,15 @@ class InviteMemberForm(forms.ModelForm):
         widgets = {
         }
 
+    # Read by TeamDetailView, which reports unknown usernames and members one by one
+    username = forms.Field(required=False, widget=UserSearchWidget)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.instance._state.adding:
+            # Leave out the people already in the team
+            self.fields['username'].widget.team = self.instance
+
 
 class TaskSortForm(forms.Form):
     """Form to allow for sorting + filtering of the task list"""
@@ -275,7 +313,8 @@ class TaskSortForm(forms.Form):
         ("deadline", "Deadline"),
         ("name", "Name"),
         ("priority", "Priority"),
-        ("author__username", "Author Username")
+        ("author__username", "Author Username"),
+        ("relevance", "Relevance")
     ]
     filter_choices = [
         ("name", "Name"),
@@ -328,9 +367,10 @@ class ModifyTaskMembersForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(ModifyTaskMembersForm, self).__init__(*args, **kwargs)
 
-        # Dynamically set the queryset for add_members and remove_members based on the team
-        if self.instance and self.instance.team:
-            team_members = self.instance.team.team_members.all()
+        # Dynamically set the queryset for add_members and remove_members based on the team, so cleaning
+        # each field checks all the chosen members with a single query
+        if self.instance and self.instance.team_id:
+            team_members = User.objects.filter(teams=self.instance.team_id)
             assigned_members = self.instance.members.all()
 
             # Set the queryset for add_members to team members not assigned to the task
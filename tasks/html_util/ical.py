@@ -0,0 +1,104 @@
+from datetime import timezone as dt_timezone
+
+from django.core import signing
+
+from tasks.models import Task, User, new_calendar_feed_secret
+
+CALENDAR_FEED_SALT = 'tasks.calendar_feed'
+
+# Task priorities mapped onto the iCalendar scale, where 1 is the highest and 9 the lowest
+ICAL_PRIORITIES = {
+    Task.Priority.URGENT: 1,
+    Task.Priority.HIGH: 3,
+    Task.Priority.MEDIUM: 5,
+    Task.Priority.LOW: 7,
+    Task.Priority.BACKLOG: 9,
+}
+
+
+def _signer(user):
+    return signing.Signer(salt=f'{CALENDAR_FEED_SALT}:{user.calendar_feed_secret}')
+
+
+def calendar_feed_token(user):
+    """Returns the token that authenticates the user's calendar feed, signed with their feed secret"""
+    return _signer(user).sign(str(user.pk))
+
+
+def get_calendar_feed_user(token):
+    """Returns the user a calendar feed token belongs to, or None if it is invalid or has been revoked"""
+    user_pk = token.partition(':')[0]
+    # isdigit() also passes digits such as '²' that int() rejects
+    if not (user_pk.isascii() and user_pk.isdecimal()):
+        return None
+    user = User.objects.filter(pk=user_pk, is_active=True).first()
+    if user is None:
+        return None
+    try:
+        _signer(user).unsign(token)
+    except signing.BadSignature:
+        return None
+    return user
+
+
+def revoke_calendar_feed_token(user):
+    """Gives the user a new feed secret, so their old feed URL stops working, and returns the new token"""
+    user.calendar_feed_secret = new_calendar_feed_secret()
+    user.save(update_fields=['calendar_feed_secret'])
+    return calendar_feed_token(user)
+
+
+def _escape(text):
+    """Escapes a TEXT value as described in RFC 5545 section 3.3.11"""
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Folds a content line to 75 octets as described in RFC 5545 section 3.1"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    folded = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte character across lines
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        folded.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(folded) + '\r\n'
+
+
+def _format_datetime(value):
+    """Formats a datetime as an iCalendar UTC date-time"""
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_event(task, domain):
+    """Returns a VEVENT for the task, placed at its deadline"""
+    deadline = _format_datetime(task.deadline)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:task-{task.pk}@{domain}',
+        f'DTSTAMP:{_format_datetime(task.updated_at)}',
+        f'LAST-MODIFIED:{_format_datetime(task.updated_at)}',
+        f'DTSTART:{deadline}',
+        f'DTEND:{deadline}',
+        f'SUMMARY:{_escape(task.name)}',
+        f'DESCRIPTION:{_escape(task.description)}',
+        f'PRIORITY:{ICAL_PRIORITIES.get(task.priority, 0)}',
+        'END:VEVENT',
+    ]
+    return ''.join(_fold(line) for line in lines)
+
+
+def stream_calendar(tasks, domain):
+    """Yields an iCalendar document for the tasks one event at a time, without loading them all into memory"""
+    yield 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Team Dingo//Task Manager//EN\r\nCALSCALE:GREGORIAN\r\n'
+    yield 'X-WR-CALNAME:Task Manager\r\n'
+    for task in tasks.only('name', 'description', 'deadline', 'priority', 'updated_at').iterator(chunk_size=500):
+        yield format_event(task, domain)
+    yield 'END:VCALENDAR\r\n'
@@ -1,10 +1,9 @@
 import calendar
 from calendar import HTMLCalendar, monthrange
+from collections import defaultdict
+from datetime import date, datetime, time
 
-from django.db.models.functions import datetime
-from django.utils.timezone import get_current_timezone
-
-from tasks.models import Task
+from django.utils import timezone
 
 
 class Timeline(HTMLCalendar):
@@ -13,20 +12,29 @@ class Timeline(HTMLCalendar):
     def __init__(self, user):
 
         self.tasks = user.task_set.all()
+        self.tasks_by_day = {}
+        self.loaded_range = None
         super(HTMLCalendar, self).__init__()
 
+    def load_tasks(self, start, end):
+        """Fetches the tasks due from start up to (not including) end in a single query, grouped by local day"""
+        if self.loaded_range is not None and self.loaded_range[0] <= start and end <= self.loaded_range[1]:
+            return
+        tz = timezone.get_current_timezone()
+        tasks = self.tasks.filter(deadline__gte=datetime.combine(start, time.min, tz),
+                                  deadline__lt=datetime.combine(end, time.min, tz))
+        tasks_by_day = defaultdict(list)
+        for task in tasks.only('name', 'description', 'deadline', 'author').order_by('deadline'):
+            tasks_by_day[timezone.localtime(task.deadline, tz).date()].append(task)
+        self.tasks_by_day = tasks_by_day
+        self.loaded_range = (start, end)
+
     def formatday(self, day, weekday):
         """Displays tasks for a given day"""
-        year = self.current_year
-        month = self.current_month
-        date = datetime.datetime(year, month, day)
-        tz = get_current_timezone()
-        day_tasks = self.tasks.filter(deadline__range=[datetime.datetime.combine(date, datetime.datetime.min.time(), tz),
-                                                       datetime.datetime.combine(date, datetime.datetime.max.time(), tz)])
+        day_tasks = self.tasks_by_day.get(date(self.current_year, self.current_month, day), [])
         html = f'<div class="col-3"><span class="border">{day}'
-        if len(day_tasks) != 0:
-            for task in day_tasks:
-                html += f'<div class="card"> <div class="card-body"> <h5 class="card-title">{task.name}</h5> <h6 class="card-subtitle mb-2 text-muted">{task.description}</h6> </div></div>'
+        for task in day_tasks:
+            html += f'<div class="card"> <div class="card-body"> <h5 class="card-title">{task.name}</h5> <h6 class="card-subtitle mb-2 text-muted">{task.description}</h6> </div></div>'
         html += '</span> </div>'
         return html
 
@@ -34,16 +42,21 @@ class Timeline(HTMLCalendar):
         """Displays tasks for a given Month"""
         self.current_year = year
         self.current_month = month
+        if month == 12:
+            self.load_tasks(date(year, month, 1), date(year + 1, 1, 1))
+        else:
+            self.load_tasks(date(year, month, 1), date(year, month + 1, 1))
 
         html = '<div class="row">'
         html += f'<h2> {calendar.month_name[month]} </h2>'
         for day in range(1, monthrange(year, month)[1], 1):
-            html += self.formatday(day, datetime.datetime(year, month, day).weekday())
+            html += self.formatday(day, date(year, month, day).weekday())
         html += '</div>'
         return html
 
     def formatyear(self, year, width=12):
         """Displays tasks for a given year"""
+        self.load_tasks(date(year, 1, 1), date(year + 1, 1, 1))
         pagination = f'<h1> {year} </h1> <nav aria-label="Year navigation"> <ul class="pagination justify-content-center">'
         html = ''
         for month in range(1, 13):
@@ -52,15 +65,19 @@ class Timeline(HTMLCalendar):
         pagination += '</ul> </nav>'
         return pagination + html
 
-    def returnHTMLPages(self):
-        """Displays tasks for from 2023 to the current year + 5"""
+    def formatpagination(self, current_year=None):
+        """Displays links to each year from 2023 to the current year + 5 without rendering their tasks"""
         oldest_date = 2023
-        current_date = datetime.timezone.localdate(datetime.timezone.now()).year + 5
+        current_date = timezone.localdate().year + 5
         pagination = '<nav aria-label="navigation"> <ul class="pagination justify-content-center">'
-        html = ''
         for year in range(oldest_date, current_date):
-            pagination += f'<li class="page-item"><a class="page-link" href="/timeline/{year}/">Year {year}</a> </li>'
-            html += self.formatyear(year)
-
+            active = ' active' if year == current_year else ''
+            pagination += f'<li class="page-item{active}"><a class="page-link" href="/timeline/{year}/">Year {year}</a> </li>'
         pagination += '</ul> </nav>'
-        return pagination + html
+        return pagination
+
+    def returnHTMLPages(self, year=None):
+        """Displays the year navigation and the tasks for a single year, the current year by default"""
+        if year is None:
+            year = timezone.localdate().year
+        return self.formatpagination(year) + self.formatyear(year)
@@ -0,0 +1,67 @@
+import random
+import statistics
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tasks.models import Task
+from tasks.search import InMemorySearchEngine, PostgresSearchEngine
+
+
+class Command(BaseCommand):
+    """Build automation command to compare the task search engines on seeded data."""
+
+    help = 'Compares the search engines on the tasks in the database; run seed first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=50, help='Number of queries per filter field')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of times each query is run')
+        parser.add_argument('--random-seed', type=int, default=0, help='Seed for picking the queries')
+
+    def handle(self, *args, **options):
+        """Times every engine on the same queries, sampled from the seeded tasks"""
+
+        if not Task.objects.exists():
+            raise CommandError('There are no tasks to search, run "manage.py seed" first.')
+
+        queries = self.sample_queries(options['queries'], random.Random(options['random_seed']))
+        engines = {'memory': InMemorySearchEngine()}
+        if connection.vendor == 'postgresql':
+            engines['postgresql'] = PostgresSearchEngine()
+
+        start = perf_counter()
+        engines['memory'].rebuild()
+        self.stdout.write(f'memory: built index of {Task.objects.count()} tasks in {self.ms(perf_counter() - start)}')
+
+        tasks = Task.objects.all()
+        for field, field_queries in queries.items():
+            for name, engine in engines.items():
+                timings = []
+                results = []
+                for query in field_queries:
+                    for _ in range(options['repeat']):
+                        start = perf_counter()
+                        matches = list(engine.search(tasks, field, query).values_list('pk', flat=True))
+                        timings.append(perf_counter() - start)
+                    results.append(len(matches))
+                self.stdout.write(
+                    f'{name:>10} {field:<17} mean {self.ms(statistics.mean(timings))}'
+                    f'  p95 {self.ms(statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0])}'
+                    f'  mean results {statistics.mean(results):.1f}'
+                )
+
+    def sample_queries(self, count, rng):
+        """Picks words from descriptions and fragments of names and usernames"""
+        rows = list(Task.objects.order_by('?').values_list('name', 'description', 'author__username')[:count])
+        words = lambda text: InMemorySearchEngine.tokenize(text) or [text]
+        fragment = lambda text: text[rng.randrange(len(text)):][:4] or text
+        return {
+            'name': [fragment(rng.choice(words(name))) for name, _, _ in rows],
+            'description': [rng.choice(words(description)) for _, description, _ in rows],
+            'author__username': [fragment(username.lstrip('@')) for _, _, username in rows],
+        }
+
+    @staticmethod
+    def ms(seconds):
+        return f'{seconds * 1000:.2f}ms'
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.participants import diff_participants, task_batches
+
+
+class Command(BaseCommand):
+    """Build automation command to verify the task participant table against the tasks."""
+
+    help = 'Reports task participant rows that are missing, out of date or left over, failing if there are any'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of tasks checked per query')
+
+    def handle(self, *args, **options):
+        """Compares batch after batch without changing anything"""
+
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        problems = 0
+        for batch in task_batches(options['batch_size']):
+            diff = diff_participants(batch)
+            for label, participants in zip(['Missing', 'Out of date', 'Left over'], diff):
+                for participant in participants:
+                    self.stdout.write(f'{label}: user {participant.user_id} on task {participant.task_id}')
+                problems += len(participants)
+
+        if problems:
+            raise CommandError(f'{problems} task participant rows are inconsistent, '
+                               f'run "manage.py rebuild_task_participants" to fix them.')
+        self.stdout.write('Task participants are consistent')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tasks.notifications import send_digests
+
+
+class Command(BaseCommand):
+    """Build automation command to send the periodic notification digest."""
+
+    help = 'Sends each user one notification summarising the events held for the digest; run it periodically'
+
+    def handle(self, *args, **options):
+        """Replaces every held event with a digest notification per recipient"""
+
+        sent = send_digests()
+        self.stdout.write(f'Sent {sent} digests')
@@ -0,0 +1,56 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.notifications import drain_outbox, outbox_metrics
+
+logger = logging.getLogger('tasks.notifications')
+
+
+class Command(BaseCommand):
+    """Build automation command to deliver the notifications queued in the outbox."""
+
+    help = 'Delivers queued notifications in batches; set NOTIFICATION_DELIVERY to "outbox" to queue them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of events delivered per transaction')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the outbox is empty')
+        parser.add_argument('--metrics', action='store_true', help='Print the queue depth and oldest event age, then exit')
+
+    def handle(self, *args, **options):
+        """Drains the outbox, then polls it for new events until interrupted"""
+
+        if options['metrics']:
+            metrics = outbox_metrics()
+            self.stdout.write(f'depth={metrics["depth"]} oldest_age={metrics["oldest_age"]:.3f}s '
+                              f'failed={metrics["failed"]}')
+            return
+
+        try:
+            while True:
+                try:
+                    delivered, latencies = drain_outbox(options['batch_size'])
+                except Exception:
+                    # A lost connection or the like; log it and try again after a pause rather than exiting
+                    logger.exception('Could not drain the notification outbox')
+                    if options['once']:
+                        return
+                    time.sleep(options['interval'])
+                    continue
+                if delivered:
+                    self.report(delivered, latencies)
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def report(self, delivered, latencies):
+        """Prints the size of a delivered batch, how long its events waited and how many are still queued"""
+        metrics = outbox_metrics()
+        self.stdout.write(f'delivered={delivered} max_latency={max(latencies):.3f}s '
+                          f'mean_latency={sum(latencies) / len(latencies):.3f}s '
+                          f'depth={metrics["depth"]} oldest_age={metrics["oldest_age"]:.3f}s failed={metrics["failed"]}')
@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tasks.notifications import prune
+
+
+class Command(BaseCommand):
+    """Build automation command to move old notifications out of the inbox table."""
+
+    help = 'Archives, or deletes, notifications older than the retention period in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+                            help='Age in days past which notifications are pruned')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of notifications per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to wait between batches')
+        parser.add_argument('--delete', action='store_true', help='Delete the notifications instead of archiving them')
+
+    def handle(self, *args, **options):
+        """Prunes batch after batch until no notification older than the cutoff is left"""
+
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must not be negative and --batch-size must be positive.')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        after_pk, total = 0, 0
+        while True:
+            after_pk, pruned = prune(cutoff, options['batch_size'], archive=not options['delete'], after_pk=after_pk)
+            if after_pk is None:
+                break
+            total += pruned
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        action = 'Deleted' if options['delete'] else 'Archived'
+        self.stdout.write(f'{action} {total} notifications from before {cutoff:%Y-%m-%d %H:%M}')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tasks.participants import sync_participants, task_batches
+
+
+class Command(BaseCommand):
+    """Build automation command to recompute the participant rows of every task."""
+
+    help = 'Rebuilds the task participant table from task authors and members, a batch of tasks at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of tasks per transaction')
+
+    def handle(self, *args, **options):
+        """Syncs batch after batch, for after bulk changes that bypassed the signals"""
+
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        tasks, created, updated, deleted = 0, 0, 0, 0
+        for batch in task_batches(options['batch_size']):
+            with transaction.atomic():
+                diff = sync_participants(batch)
+            tasks += len(batch)
+            created += len(diff.missing)
+            updated += len(diff.changed)
+            deleted += len(diff.extra)
+
+        self.stdout.write(f'Rebuilt the participants of {tasks} tasks: '
+                          f'{created} created, {updated} updated, {deleted} deleted')
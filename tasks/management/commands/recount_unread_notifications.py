@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tasks.notifications import recount_unread
+
+
+class Command(BaseCommand):
+    """Build automation command to rebuild the users' unread notification counters."""
+
+    help = 'Recomputes every unread notification counter from the notifications, should one have drifted'
+
+    def handle(self, *args, **options):
+        """Recounts the unread notifications of every user"""
+
+        recounted = recount_unread()
+        self.stdout.write(f'Recounted the unread notifications of {recounted} users')
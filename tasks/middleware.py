@@ -1,10 +1,20 @@
 """Middleware for the tasks app"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
 # zoneinfo was added in Python 3.9
 try:
     import zoneinfo
 except ImportError:
     from backports import zoneinfo
 import pytz
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.utils import timezone
 
 class TimezoneMiddleware:
@@ -27,4 +37,104 @@ from django.utils.deprecation import MiddlewareMixin
 class AllowIframeMiddleware(MiddlewareMixin):
     def process_response(self, request, response):
         response['X-Frame-Options'] = 'ALLOWALL'  # Or specify your allowed origin(s)
-        return response
\ No newline at end of file
+        return response
+
+
+query_logger = logging.getLogger('tasks.queries')
+
+# Literals and expanded parameter lists that vary between otherwise identical queries
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_PARAMETER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a view runs more queries than its declared budget and QUERY_BUDGET_STRICT is set."""
+
+
+def query_budget(budget):
+    """Decorator declaring the most queries a function view may run per request"""
+    def decorator(view_function):
+        view_function.query_budget = budget
+        return view_function
+    return decorator
+
+
+def normalize_sql(sql):
+    """Returns the shape of a query, with literals and parameter lists collapsed so repeats group together"""
+    sql = _SQL_LITERAL.sub('?', sql)
+    return _SQL_PARAMETER_LIST.sub('%s, ...', sql)
+
+
+class QueryRecorder:
+    """Database execute wrapper counting and timing the queries run while it is installed"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[normalize_sql(sql)] += 1
+
+    def repeated_shapes(self, limit):
+        """Returns the most common query shapes that ran more than once"""
+        return [(shape, count) for shape, count in self.shapes.most_common(limit) if count > 1]
+
+
+class QueryInstrumentationMiddleware:
+    """Records the queries each request runs, reporting them in a Server-Timing header and a log line.
+
+    Enabled by the QUERY_INSTRUMENTATION setting. Views declare a budget with a query_budget attribute
+    (or the query_budget decorator); going over it logs a warning, or raises with QUERY_BUDGET_STRICT."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request.query_budget = None
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        self.report(request, response, recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request.query_budget = getattr(view_class or view_func, 'query_budget', None)
+        request.query_view_name = (view_class or view_func).__name__
+
+    def report(self, request, response, recorder):
+        duration = recorder.duration * 1000
+        response['Server-Timing'] = f'db;dur={duration:.1f};desc="{recorder.count} queries"'
+        top = getattr(settings, 'QUERY_INSTRUMENTATION_TOP_SHAPES', 5)
+        repeated = recorder.repeated_shapes(top)
+        budget = request.query_budget
+        query_logger.info(json.dumps({
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'view': getattr(request, 'query_view_name', None),
+            'queries': recorder.count,
+            'db_ms': round(duration, 1),
+            'budget': budget,
+            'repeated': [{'sql': shape, 'count': count} for shape, count in repeated],
+        }))
+        if budget is None or recorder.count <= budget:
+            return
+        message = (f'{request.query_view_name} ran {recorder.count} queries for {request.method} {request.path}, '
+                   f'over its budget of {budget}')
+        if repeated:
+            message += '; most repeated: ' + '; '.join(f'{count}x {shape}' for shape, count in repeated)
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        query_logger.warning(message)
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_task_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['author', 'deadline'], name='task_author_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['team', 'deadline'], name='task_team_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['deadline', 'id'], name='task_deadline_id_idx'),
+        ),
+        # The auto-created members table cannot declare Meta.indexes; lead with the member so
+        # "tasks assigned to me" lookups are index-only scans
+        migrations.RunSQL(
+            sql='CREATE INDEX task_members_user_task_idx ON tasks_task_members (user_id, task_id);',
+            reverse_sql='DROP INDEX task_members_user_task_idx;',
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:06
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import DatabaseError, migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def populate_search_vectors(apps, schema_editor):
+    """Fills in the search vector of existing tasks, a batch of ids at a time"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Task = apps.get_model('tasks', 'Task')
+    vector = SearchVector('name', weight='A', config='english') + SearchVector('description', weight='B', config='english')
+    last_pk = 0
+    while True:
+        batch = list(Task.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not batch:
+            break
+        Task.objects.filter(pk__in=batch).update(search_vector=vector)
+        last_pk = batch[-1]
+
+
+def enable_pg_trgm(schema_editor):
+    """Returns whether pg_trgm is installed, installing it if it is available and the role may do so.
+
+    Creating an extension takes a superuser, or the CREATE privilege on the database for trusted extensions
+    such as pg_trgm on PostgreSQL 13 and later. Roles without either can have an administrator run
+    CREATE EXTENSION pg_trgm beforehand; otherwise the trigram indexes are left out and name searches scan."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT installed_version IS NOT NULL FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        row = cursor.fetchone()
+    if row is None:
+        return False
+    if row[0]:
+        return True
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION pg_trgm')
+    except DatabaseError:
+        return False
+    return True
+
+
+def create_search_indexes(apps, schema_editor):
+    """Creates the GIN indexes on PostgreSQL, with trigram indexes for substring matches where pg_trgm can be used"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX task_search_vector_idx ON tasks_task USING gin (search_vector)')
+    if not enable_pg_trgm(schema_editor):
+        return
+    # Match the UPPER(column::text) LIKE expression that __icontains compiles to
+    schema_editor.execute('CREATE INDEX task_name_trgm_idx ON tasks_task USING gin (UPPER(name::text) gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX user_username_trgm_idx ON tasks_user USING gin (UPPER(username::text) gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in ['task_search_vector_idx', 'task_name_trgm_idx', 'user_username_trgm_idx']:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_task_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='digest',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='kind',
+            field=models.CharField(choices=[('message', 'Message'), ('task_assigned', 'Task Assigned'), ('task_unassigned', 'Task Unassigned'), ('task_modified', 'Task Modified'), ('task_deleted', 'Task Deleted'), ('team_added', 'Team Added'), ('team_removed', 'Team Removed'), ('digest', 'Digest')], default='message', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notifications',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notifications',
+            name='kind',
+            field=models.CharField(choices=[('message', 'Message'), ('task_assigned', 'Task Assigned'), ('task_unassigned', 'Task Unassigned'), ('task_modified', 'Task Modified'), ('task_deleted', 'Task Deleted'), ('team_added', 'Team Added'), ('team_removed', 'Team Removed'), ('digest', 'Digest')], default='message', max_length=20),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_notification_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notifications',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notifications',
+            index=models.Index(fields=['recipient', 'read_at', '-timestamp'], name='notification_inbox_idx'),
+        ),
+    ]
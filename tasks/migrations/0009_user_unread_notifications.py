@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread_notifications(apps, schema_editor):
+    """Starts every user's counter at the number of unread notifications they already have"""
+    User = apps.get_model('tasks', 'User')
+    Notifications = apps.get_model('tasks', 'Notifications')
+    unread = (Notifications.objects.filter(recipient=OuterRef('pk'), read_at__isnull=True).order_by()
+              .values('recipient').annotate(count=Count('pk')).values('count'))
+    User.objects.update(unread_notifications=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_notification_read_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_unread_notifications, migrations.RunPython.noop),
+    ]
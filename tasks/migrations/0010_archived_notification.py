@@ -0,0 +1,34 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_user_unread_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.BigIntegerField(unique=True)),
+                ('sender_id', models.BigIntegerField()),
+                ('task_id', models.BigIntegerField(blank=True, null=True)),
+                ('message', models.TextField()),
+                ('kind', models.CharField(choices=[('message', 'Message'), ('task_assigned', 'Task Assigned'), ('task_unassigned', 'Task Unassigned'), ('task_modified', 'Task Modified'), ('task_deleted', 'Task Deleted'), ('team_added', 'Team Added'), ('team_removed', 'Team Removed'), ('digest', 'Digest')], default='message', max_length=20)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('timestamp', models.DateTimeField()),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipient', 'timestamp'], name='archived_notification_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:05
+
+from django.db import migrations
+
+SEARCHED_COLUMNS = ['username', 'first_name', 'last_name']
+
+
+def create_search_indexes(apps, schema_editor):
+    """Creates pattern indexes for the user search's prefix matches on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Match the UPPER(column::text) LIKE expression that __istartswith compiles to; text_pattern_ops serves
+    # LIKE prefixes whatever the database collation
+    for column in SEARCHED_COLUMNS:
+        schema_editor.execute(f'CREATE INDEX user_{column}_prefix_idx ON tasks_user '
+                              f'(UPPER({column}::text) text_pattern_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCHED_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS user_{column}_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_archived_notification'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils.text import slugify
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def unique_slugs(team_names):
+    """Returns a unique slug for each team name, numbering repeats"""
+    taken = set()
+    slugs = {}
+    for team_name in team_names:
+        base = slugify(team_name)[:50] or 'team'
+        slug = base
+        suffix = 2
+        while slug in taken:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        taken.add(slug)
+        slugs[team_name] = slug
+    return slugs
+
+
+def copy_teams(apps, schema_editor):
+    """Copies the teams into the table keyed by id, then points their tasks and memberships at the copies,
+    a batch of teams at a time"""
+    Team = apps.get_model('tasks', 'Team')
+    NewTeam = apps.get_model('tasks', 'NewTeam')
+    Task = apps.get_model('tasks', 'Task')
+    Membership = Team.team_members.through
+    NewMembership = NewTeam.team_members.through
+    slugs = unique_slugs(Team.objects.order_by('team_name').values_list('team_name', flat=True))
+    team_names = list(slugs)
+    for start in range(0, len(team_names), BATCH_SIZE):
+        batch = team_names[start:start + BATCH_SIZE]
+        NewTeam.objects.bulk_create([
+            NewTeam(team_name=team_name, slug=slugs[team_name], team_admin_id=team_admin_id)
+            for team_name, team_admin_id in Team.objects.filter(team_name__in=batch).values_list('team_name',
+                                                                                               'team_admin_id')
+        ])
+        team_ids = dict(NewTeam.objects.filter(team_name__in=batch).values_list('team_name', 'id'))
+        Task.objects.filter(team_id__in=batch).update(
+            new_team=Subquery(NewTeam.objects.filter(team_name=OuterRef('team_id')).values('id')[:1]))
+        NewMembership.objects.bulk_create([
+            NewMembership(newteam_id=team_ids[team_id], user_id=user_id)
+            for team_id, user_id in Membership.objects.filter(team_id__in=batch).values_list('team_id', 'user_id')
+        ], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+    """Copies the teams into a table keyed by a BigAutoField; 0013 swaps it in for the one keyed by name.
+
+    The swap is a migration of its own because PostgreSQL cannot alter tables that still have deferred
+    foreign key checks pending from the copy in the same transaction."""
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0011_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewTeam',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team_name', models.CharField(max_length=50, unique=True)),
+                ('slug', models.SlugField(editable=False, max_length=60, unique=True)),
+                ('team_admin', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                                 to=settings.AUTH_USER_MODEL)),
+                ('team_members', models.ManyToManyField(related_name='new_teams', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='new_team',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                    to='tasks.newteam'),
+        ),
+        # Irreversible: the teams keyed by name cannot be rebuilt once 0013 has swapped them out
+        migrations.RunPython(copy_teams),
+    ]
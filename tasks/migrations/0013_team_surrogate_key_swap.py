@@ -0,0 +1,54 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """Replaces the teams keyed by name with the copies keyed by id made in 0012."""
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0012_team_surrogate_key'),
+    ]
+
+    operations = [
+        # Has nothing to do going forwards, but having no reverse code marks the swap as irreversible, so
+        # migrating back stops here instead of failing part way through
+        migrations.RunPython(migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_team_deadline_idx',
+        ),
+        migrations.RemoveField(
+            model_name='task',
+            name='team',
+        ),
+        migrations.DeleteModel(
+            name='Team',
+        ),
+        migrations.RenameModel(
+            old_name='NewTeam',
+            new_name='Team',
+        ),
+        migrations.RenameField(
+            model_name='task',
+            old_name='new_team',
+            new_name='team',
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='team',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.team'),
+        ),
+        migrations.AlterField(
+            model_name='team',
+            name='team_members',
+            field=models.ManyToManyField(related_name='teams', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['team', 'deadline'], name='task_team_deadline_idx'),
+        ),
+    ]
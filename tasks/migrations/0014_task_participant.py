@@ -0,0 +1,60 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+MEMBER, AUTHOR = 1, 2
+
+
+def populate_participants(apps, schema_editor):
+    """Adds a participant row for the author and each member of existing tasks, a batch of tasks at a time"""
+    Task = apps.get_model('tasks', 'Task')
+    TaskParticipant = apps.get_model('tasks', 'TaskParticipant')
+    last_pk = 0
+    while True:
+        tasks = {pk: (author_id, deadline, priority) for pk, author_id, deadline, priority in
+                 Task.objects.filter(pk__gt=last_pk).order_by('pk')
+                 .values_list('pk', 'author_id', 'deadline', 'priority')[:BATCH_SIZE]}
+        if not tasks:
+            break
+        roles = {(author_id, pk): AUTHOR for pk, (author_id, _, _) in tasks.items()}
+        for user_id, task_id in Task.members.through.objects.filter(task_id__in=tasks).values_list('user_id',
+                                                                                                  'task_id'):
+            roles[user_id, task_id] = roles.get((user_id, task_id), 0) | MEMBER
+        TaskParticipant.objects.bulk_create([
+            TaskParticipant(user_id=user_id, task_id=task_id, role=role, deadline=tasks[task_id][1],
+                            priority=tasks[task_id][2])
+            for (user_id, task_id), role in roles.items()
+        ])
+        last_pk = max(tasks)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_team_surrogate_key_swap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.PositiveSmallIntegerField(choices=[(1, 'Member'), (2, 'Author'), (3, 'Both')])),
+                ('deadline', models.DateTimeField()),
+                ('priority', models.IntegerField(choices=[(1, 'Backlog'), (2, 'Low'), (3, 'Medium'), (4, 'High'), (5, 'Urgent')])),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='tasks.task')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'deadline'], name='task_participant_deadline_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='taskparticipant',
+            constraint=models.UniqueConstraint(fields=('user', 'task'), name='task_participant_unique'),
+        ),
+        migrations.RunPython(populate_participants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Matches the weights and configuration the search queries rank with
+CREATE_TRIGGER = """
+CREATE FUNCTION task_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := setweight(to_tsvector('english'::regconfig, COALESCE(NEW.name, '')), 'A')
+                         || setweight(to_tsvector('english'::regconfig, COALESCE(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER task_search_vector_trigger BEFORE INSERT OR UPDATE OF name, description ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION task_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS task_search_vector_trigger ON tasks_task;
+DROP FUNCTION IF EXISTS task_search_vector_update();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    """Has PostgreSQL keep the search vector current on every write, then refreshes vectors left stale by
+    writes that bypassed the save signal, a batch of ids at a time"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_TRIGGER)
+    Task = apps.get_model('tasks', 'Task')
+    last_pk = 0
+    while True:
+        batch = list(Task.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not batch:
+            break
+        # Setting the name to itself is enough to fire the trigger
+        Task.objects.filter(pk__in=batch).update(name=models.F('name'))
+        last_pk = batch[-1]
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0015_notification_outbox_failed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
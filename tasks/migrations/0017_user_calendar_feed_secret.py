@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+import tasks.models
+
+BATCH_SIZE = 1000
+
+
+def generate_secrets(apps, schema_editor):
+    """Gives every existing user a secret of their own, a batch of ids at a time"""
+    User = apps.get_model('tasks', 'User')
+    last_pk = 0
+    while True:
+        batch = list(User.objects.filter(pk__gt=last_pk).order_by('pk').only('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+        for user in batch:
+            user.calendar_feed_secret = tasks.models.new_calendar_feed_secret()
+        User.objects.bulk_update(batch, ['calendar_feed_secret'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    """Adds the per-user calendar feed secret; the feed URLs given out before it stop working."""
+
+    dependencies = [
+        ('tasks', '0016_task_search_vector_trigger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='calendar_feed_secret',
+            field=models.CharField(default='', editable=False, max_length=32),
+            preserve_default=False,
+        ),
+        migrations.RunPython(generate_secrets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='calendar_feed_secret',
+            field=models.CharField(default=tasks.models.new_calendar_feed_secret, editable=False, max_length=32),
+        ),
+    ]
@@ -1,11 +1,19 @@
+import secrets
 from datetime import timedelta
 
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.utils.text import slugify
 from libgravatar import Gravatar
 
+def new_calendar_feed_secret():
+    """Returns a random secret for a user's calendar feed token"""
+    return secrets.token_hex(16)
+
+
 class User(AbstractUser):
     """Model used for user authentication, and team member related information."""
 
@@ -20,6 +28,11 @@ class User(AbstractUser):
     first_name = models.CharField(max_length=50, blank=False)
     last_name = models.CharField(max_length=50, blank=False)
     email = models.EmailField(unique=True, blank=False)
+    # Maintained with atomic increments by tasks.notifications, so the navbar badge needs no COUNT; saves of loaded
+    # users name their update_fields, so they do not write back a count that has moved since
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
+    # Salts the calendar feed token; replacing it revokes every feed URL given out so far
+    calendar_feed_secret = models.CharField(max_length=32, default=new_calendar_feed_secret, editable=False)
 
 
     class Meta:
@@ -48,10 +61,45 @@ class User(AbstractUser):
 class Team(models.Model):
     """Model used to represent a team, namely its name and members"""
 
-    team_name = models.CharField(max_length=50,unique=True, blank=False, primary_key=True)
+    team_name = models.CharField(max_length=50,unique=True, blank=False)
+    # Identifies the team in URLs; set from the name when the team is created and kept if it is renamed
+    slug = models.SlugField(max_length=60, unique=True, editable=False)
     team_members = models.ManyToManyField(User, related_name='teams', blank=False)
     team_admin = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
 
+    # Times a new team picks a fresh slug after losing it to a team created at the same time
+    SLUG_ATTEMPTS = 5
+
+    def save(self, *args, **kwargs):
+        """Gives new teams a unique slug made from their name, picking another should a concurrent save take it."""
+
+        if self.slug:
+            super().save(*args, **kwargs)
+            return
+        for attempt in range(self.SLUG_ATTEMPTS):
+            self.slug = self.unique_slug(self.team_name)
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                lost_slug = Team.objects.filter(slug=self.slug).exists()
+                self.slug = ''
+                if not lost_slug or attempt == self.SLUG_ATTEMPTS - 1:
+                    raise
+
+    @staticmethod
+    def unique_slug(team_name):
+        """Returns a slug for the name that no team has, numbering it if need be"""
+        base = slugify(team_name)[:50] or 'team'
+        taken = set(Team.objects.filter(slug__startswith=base).values_list('slug', flat=True))
+        slug = base
+        suffix = 2
+        while slug in taken:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        return slug
+
     def invite_member(self,user):
         """method to invite user to team"""
         self.team_members.add(user)
@@ -82,6 +130,20 @@ class Task(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, blank=False)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, blank=False)
     members = models.ManyToManyField(User, related_name='assigned_members', blank=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained from the name and description by a trigger on PostgreSQL, see migration 0016
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        """Model options."""
+
+        indexes = [
+            models.Index(fields=['author', 'deadline'], name='task_author_deadline_idx'),
+            models.Index(fields=['team', 'deadline'], name='task_team_deadline_idx'),
+            models.Index(fields=['deadline', 'id'], name='task_deadline_id_idx'),
+            models.Index(fields=['name', 'id'], name='task_name_id_idx'),
+            models.Index(fields=['priority', 'id'], name='task_priority_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -89,18 +151,110 @@ class Task(models.Model):
     
 
 class Notifications(models.Model):
+
+    class Kind(models.TextChoices):
+        """What a notification is about, so repeats of the same event can be merged"""
+        MESSAGE = 'message'
+        TASK_ASSIGNED = 'task_assigned'
+        TASK_UNASSIGNED = 'task_unassigned'
+        TASK_MODIFIED = 'task_modified'
+        TASK_DELETED = 'task_deleted'
+        TEAM_ADDED = 'team_added'
+        TEAM_REMOVED = 'team_removed'
+        DIGEST = 'digest'
+
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications_receieved')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications_sent', default=1)
     message = models.TextField(max_length=100, blank=False)
     timestamp = models.DateTimeField(auto_now_add=True)
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=Kind.choices, default=Kind.MESSAGE)
+    # Number of events merged into this notification, the timestamp being that of the latest
+    count = models.PositiveIntegerField(default=1)
+    read_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-timestamp'] # Order by timestamp in descending order
+        indexes = [
+            # Serves the inbox and unread lookups, newest first
+            models.Index(fields=['recipient', 'read_at', '-timestamp'], name='notification_inbox_idx'),
+        ]
 
     def __str__(self):
         return f'{self.sender} to {self.recipient}: {self.message}'
 
+class ArchivedNotification(models.Model):
+    """A notification moved out of the inbox by the prune_notifications command, kept for later lookups"""
+    notification_id = models.BigIntegerField(unique=True)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Plain ids, so the archive outlives the senders and tasks it mentions
+    sender_id = models.BigIntegerField()
+    task_id = models.BigIntegerField(null=True, blank=True)
+    message = models.TextField()
+    kind = models.CharField(max_length=20, choices=Notifications.Kind.choices, default=Notifications.Kind.MESSAGE)
+    count = models.PositiveIntegerField(default=1)
+    timestamp = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'timestamp'], name='archived_notification_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.sender_id} to {self.recipient}: {self.message}'
+
+
+class NotificationOutbox(models.Model):
+    """A notification event waiting for the notification worker to deliver it to its recipients"""
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    message = models.TextField(max_length=100, blank=False)
+    # Kept when the task is deleted before delivery, the notification is then sent without it
+    task = models.ForeignKey(Task, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    recipient_ids = models.JSONField(default=list)
+    kind = models.CharField(max_length=20, choices=Notifications.Kind.choices, default=Notifications.Kind.MESSAGE)
+    # Held for the periodic digest rather than delivered by the worker
+    digest = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when delivery failed, so the worker leaves the event for someone to look at rather than retrying it
+    failed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'{self.sender} to {len(self.recipient_ids)} recipients: {self.message}'
+
+class TaskParticipant(models.Model):
+    """A task as listed for one of its members or its author, with the columns those lists filter and sort on.
+
+    Maintained by tasks.participants from task saves and member changes, so a user's tasks are a single range
+    of the (user, deadline) index rather than an OR across the members join."""
+
+    class Role(models.IntegerChoices):
+        """How the user takes part in the task; a bit each for being a member and the author"""
+        MEMBER = 1
+        AUTHOR = 2
+        BOTH = 3
+
+    # Lookups by user are served by the (user, deadline) index
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_index=False)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='participants')
+    role = models.PositiveSmallIntegerField(choices=Role.choices)
+    deadline = models.DateTimeField()
+    priority = models.IntegerField(choices=Task.Priority.choices)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'task'], name='task_participant_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'deadline'], name='task_participant_deadline_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} on {self.task_id} as {self.get_role_display()}'
+
+
 class TimeLogging(models.Model):
     """record how many time a user spent on a task"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
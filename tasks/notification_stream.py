@@ -0,0 +1,157 @@
+"""Live notification delivery over server-sent events for the tasks app"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from tasks.models import Notifications, User
+
+# Most notifications sent in one go, the rest follow on the next wake-up
+STREAM_BATCH_SIZE = 100
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Where a stream starts for a user who has no notifications yet
+START = (EPOCH, 0)
+
+
+class NotificationBroker:
+    """In-process pub/sub that wakes up the open streams of users who have just been notified.
+
+    It only reaches streams served by this process, so streams also poll the database now and then to pick
+    up notifications written elsewhere, such as by the notification worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # user id -> (event loop, event) of every open stream
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        """Registers a stream for the user, returning the event set when there is something new for them"""
+        subscription = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self.subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self.lock:
+            self.subscribers[user_id].discard(subscription)
+            if not self.subscribers[user_id]:
+                del self.subscribers[user_id]
+
+    def publish(self, user_ids):
+        """Wakes up the streams of the users; safe to call from any thread"""
+        with self.lock:
+            subscriptions = [subscription for user_id in user_ids for subscription in self.subscribers.get(user_id, ())]
+        for loop, event in subscriptions:
+            loop.call_soon_threadsafe(event.set)
+
+
+broker = NotificationBroker()
+
+
+def encode_position(timestamp, pk):
+    """Returns a stream position as an event id, the timestamp in microseconds then the notification id"""
+    return f'{(timestamp - EPOCH) // timedelta(microseconds=1)}-{pk}'
+
+
+def decode_position(event_id):
+    """Returns the (timestamp, id) position an event id points at, or None if it is not one"""
+    microseconds, _, pk = event_id.partition('-')
+    # isdigit() also passes digits such as '²' that int() rejects
+    if not all(part.isascii() and part.isdecimal() for part in (microseconds, pk)):
+        return None
+    try:
+        return EPOCH + timedelta(microseconds=int(microseconds)), int(pk)
+    except OverflowError:
+        return None
+
+
+def format_event(notification, unread):
+    """Returns a notification as a server-sent event, with its position so reconnecting clients can resume after it"""
+    data = json.dumps({
+        'id': notification.pk,
+        'sender': str(notification.sender),
+        'message': notification.message,
+        'kind': notification.kind,
+        'count': notification.count,
+        'task': notification.task_id,
+        'timestamp': notification.timestamp.isoformat(),
+        'unread': unread,
+    })
+    return f'id: {encode_position(notification.timestamp, notification.pk)}\nevent: notification\ndata: {data}\n\n'
+
+
+def latest_position(user_id):
+    """Returns the position of the user's most recently written or merged notification, where a new stream starts"""
+    latest = (Notifications.objects.filter(recipient_id=user_id).order_by('-timestamp', '-pk')
+              .values_list('timestamp', 'pk').first())
+    return latest or START
+
+
+def fetch_new(user_id, after):
+    """Returns the user's notifications written or merged into since the (timestamp, id) position, oldest first,
+    with their unread count.
+
+    Merging a repeat into a notification moves its timestamp on, so it is sent again with its new count."""
+    timestamp, pk = after
+    notifications = list(Notifications.objects.filter(recipient_id=user_id)
+                         .filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk))
+                         .select_related('sender').order_by('timestamp', 'pk')[:STREAM_BATCH_SIZE])
+    unread = None
+    if notifications:
+        unread = User.objects.filter(pk=user_id).values_list('unread_notifications', flat=True).first()
+    return notifications, unread
+
+
+def stream_start(after, poll_interval):
+    """Returns the first chunk of a stream: how long the browser waits before reconnecting, and the position it
+    resumes from if nothing else is sent before then"""
+    return f'retry: {int(poll_interval * 1000)}\nid: {encode_position(*after)}\n\n'
+
+
+def poll_notifications(user_id, after):
+    """Returns the user's new notifications as a short, complete stream, for servers that cannot hold one open.
+
+    Run under WSGI, where a long-lived stream would tie up a worker; the browser polls by reconnecting after
+    NOTIFICATION_STREAM_POLL_INTERVAL seconds, picking up from the last event it saw."""
+    chunks = [stream_start(after, getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 15))]
+    notifications, unread = fetch_new(user_id, after)
+    chunks += [format_event(notification, unread) for notification in notifications]
+    return chunks
+
+
+async def stream_notifications(user_id, after):
+    """Yields the user's new notifications as server-sent events until the client goes away or the stream
+    reaches its maximum age.
+
+    Waits on the broker between database reads, or for the poll interval at most, sending a comment
+    whenever nothing new turned up to keep idle connections open through proxies. Streams end after
+    NOTIFICATION_STREAM_MAX_AGE seconds, as a disconnected client is only noticed when a write fails;
+    browsers reconnect on their own and pick up where they left off."""
+    poll_interval = getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 15)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, 'NOTIFICATION_STREAM_MAX_AGE', 300)
+    subscription = broker.subscribe(user_id)
+    event = subscription[1]
+    try:
+        yield stream_start(after, poll_interval)
+        while loop.time() < deadline:
+            event.clear()
+            notifications, unread = await sync_to_async(fetch_new)(user_id, after)
+            for notification in notifications:
+                yield format_event(notification, unread)
+            if notifications:
+                after = (notifications[-1].timestamp, notifications[-1].pk)
+                if len(notifications) == STREAM_BATCH_SIZE:
+                    continue
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(poll_interval, max(deadline - loop.time(), 0)))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+    finally:
+        broker.unsubscribe(user_id, subscription)
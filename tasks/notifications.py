@@ -0,0 +1,257 @@
+"""Notification fan-out for the tasks app"""
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F, Min, OuterRef, Q, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from tasks.models import ArchivedNotification, NotificationOutbox, Notifications, User
+from tasks.notification_stream import broker
+
+logger = logging.getLogger(__name__)
+
+# Kinds whose repeats about the same task are merged into the recipient's latest notification
+COALESCED_KINDS = {Notifications.Kind.TASK_MODIFIED}
+
+
+def _recipient_ids(recipients):
+    """Returns the distinct ids of the recipients, in order, without loading users from a queryset"""
+    if isinstance(recipients, QuerySet):
+        recipients = recipients.order_by().values_list('pk', flat=True)
+    else:
+        recipients = (recipient.pk for recipient in recipients)
+    return list(dict.fromkeys(recipients))
+
+
+def adjust_unread(deltas):
+    """Moves users' unread counters by the given amounts, a mapping of user id to change.
+
+    Users moving by the same amount share an UPDATE, and each is an atomic increment, so concurrent
+    fan-outs to the same user add up."""
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        User.objects.filter(pk__in=user_ids).update(
+            unread_notifications=Greatest(F('unread_notifications') + delta, Value(0)))
+
+
+def recount_unread(users=None):
+    """Recomputes the unread counters of the users, all of them by default, from their notifications"""
+    unread = (Notifications.objects.filter(recipient=OuterRef('pk'), read_at__isnull=True).order_by()
+              .values('recipient').annotate(count=Count('pk')).values('count'))
+    users = User.objects.all() if users is None else users
+    return users.update(unread_notifications=Coalesce(Subquery(unread), 0))
+
+
+def mark_read(notifications, user):
+    """Marks the user's unread notifications among those given as read, returning how many there were"""
+    with transaction.atomic(savepoint=False):
+        read = notifications.filter(recipient=user, read_at__isnull=True).update(read_at=timezone.now())
+        adjust_unread({user.pk: -read})
+    return read
+
+
+def _create(notifications):
+    """Writes new notifications with a single INSERT, counts them as unread and wakes up the recipients' streams"""
+    if not notifications:
+        return []
+    created = Notifications.objects.bulk_create(notifications)
+    recipients = Counter(notification.recipient_id for notification in notifications)
+    adjust_unread(recipients)
+    transaction.on_commit(lambda: broker.publish(recipients))
+    return created
+
+
+def _coalesce(recipient_ids, sender_id, message, task_id, kind):
+    """Merges an event into the recipients' unread notifications of its kind and task within the coalescing window.
+
+    Returns the ids of the recipients whose notifications absorbed it."""
+    now = timezone.now()
+    window = timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 3600))
+    recent = Notifications.objects.filter(recipient_id__in=recipient_ids, task_id=task_id, kind=kind,
+                                          read_at__isnull=True, timestamp__gte=now - window)
+    with transaction.atomic():
+        # Locking the rows keeps concurrent merges from losing counts
+        merged = list(recent.order_by().select_for_update().values_list('pk', 'recipient_id'))
+        if merged:
+            Notifications.objects.filter(pk__in=[pk for pk, _ in merged]).update(
+                count=F('count') + 1, timestamp=now, message=message, sender_id=sender_id)
+    merged_ids = {recipient_id for _, recipient_id in merged}
+    if merged_ids:
+        # Open streams send merged notifications again, as the new timestamp moves them past their position
+        transaction.on_commit(lambda: broker.publish(merged_ids))
+    return merged_ids
+
+
+def deliver(recipient_ids, sender_id, message, task_id=None, kind=Notifications.Kind.MESSAGE):
+    """Writes the notifications for an event with a single INSERT, merging repeats of coalesced kinds.
+
+    Returns the notifications created."""
+    if kind in COALESCED_KINDS and task_id is not None:
+        merged = _coalesce(recipient_ids, sender_id, message, task_id, kind)
+        recipient_ids = [recipient_id for recipient_id in recipient_ids if recipient_id not in merged]
+    return _create([Notifications(recipient_id=recipient_id, sender_id=sender_id, message=message,
+                                  task_id=task_id, kind=kind)
+                    for recipient_id in recipient_ids])
+
+
+def notify(recipients, sender, message, task=None, kind=Notifications.Kind.MESSAGE):
+    """Sends the same message to every recipient.
+
+    Kinds listed in the NOTIFICATION_DIGEST_KINDS setting are held for the digest. Otherwise, with the
+    NOTIFICATION_DELIVERY setting at 'outbox' this only queues a single outbox row for the notification
+    worker, and without it the notifications are written straight away.
+    The writes share a transaction, so notifications and unread counters commit together. Callers that want
+    nothing sent if the change it describes is rolled back make both in a transaction.atomic() block of
+    their own."""
+    recipient_ids = _recipient_ids(recipients)
+    if not recipient_ids:
+        return []
+    digest = kind in getattr(settings, 'NOTIFICATION_DIGEST_KINDS', [])
+    # No savepoint is needed inside a caller's transaction, as a failure rolls that back too
+    with transaction.atomic(savepoint=False):
+        if digest or getattr(settings, 'NOTIFICATION_DELIVERY', 'immediate') == 'outbox':
+            NotificationOutbox.objects.create(recipient_ids=recipient_ids, sender=sender, message=message, task=task,
+                                              kind=kind, digest=digest)
+            return []
+        return deliver(recipient_ids, sender.pk, message, task_id=task.pk if task else None, kind=kind)
+
+
+def _existing_user_ids(events):
+    """Returns the ids among the events' recipients that still belong to users.
+
+    Recipient lists have no foreign key, so they can name users deleted since the event was queued."""
+    recipient_ids = {recipient_id for event in events for recipient_id in event.recipient_ids}
+    return set(User.objects.filter(pk__in=recipient_ids).values_list('pk', flat=True))
+
+
+def _deliver_events(events, user_ids):
+    """Writes the notifications of queued events to the recipients among the user ids"""
+    _create([
+        Notifications(recipient_id=recipient_id, sender_id=event.sender_id, message=event.message,
+                      task_id=event.task_id, kind=event.kind)
+        for event in events if event.kind not in COALESCED_KINDS
+        for recipient_id in event.recipient_ids if recipient_id in user_ids
+    ])
+    # Coalesced events go one at a time, as each may merge into the notifications of the one before
+    for event in events:
+        if event.kind in COALESCED_KINDS:
+            deliver([recipient_id for recipient_id in event.recipient_ids if recipient_id in user_ids],
+                    event.sender_id, event.message, task_id=event.task_id, kind=event.kind)
+    # Foreign keys are only checked at commit otherwise, when a failure would take the whole batch with it
+    connection.check_constraints(table_names=[Notifications._meta.db_table])
+
+
+def drain_outbox(batch_size=100):
+    """Delivers a batch of queued events, returning how many were taken off the queue and how long each had waited.
+
+    Rows are claimed with SKIP LOCKED, so several workers can drain the outbox side by side. The batch is
+    written in a savepoint; should that fail, each event is retried in its own, and those that still fail
+    are marked as failed and kept out of later batches, so one bad event cannot hold up the queue."""
+    with transaction.atomic():
+        events = list(NotificationOutbox.objects.select_for_update(skip_locked=True)
+                      .filter(digest=False, failed_at__isnull=True).order_by('pk')[:batch_size])
+        if not events:
+            return 0, []
+        user_ids = _existing_user_ids(events)
+        failed = {}
+        try:
+            with transaction.atomic():
+                _deliver_events(events, user_ids)
+        except DatabaseError:
+            for event in events:
+                try:
+                    with transaction.atomic():
+                        _deliver_events([event], user_ids)
+                except DatabaseError as error:
+                    logger.exception('Could not deliver outbox event %s', event.pk)
+                    failed[event.pk] = str(error)
+        NotificationOutbox.objects.filter(pk__in=[event.pk for event in events if event.pk not in failed]).delete()
+        now = timezone.now()
+        for pk, error in failed.items():
+            NotificationOutbox.objects.filter(pk=pk).update(failed_at=now, error=error)
+    return len(events), [(now - event.created_at).total_seconds() for event in events]
+
+
+def digest_message(count, task_names):
+    """Summarises the events held for a recipient in a single line"""
+    updates = f'{count} update{"" if count == 1 else "s"}'
+    if not task_names:
+        return f'Digest: {updates}.'
+    if len(task_names) > 3:
+        return f'Digest: {updates} to {", ".join(task_names[:3])} and {len(task_names) - 3} more tasks.'
+    return f'Digest: {updates} to {", ".join(task_names)}.'
+
+
+def send_digests():
+    """Replaces the events held for the digest with one notification per recipient, returning how many were sent"""
+    with transaction.atomic():
+        events = list(NotificationOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+                      .filter(digest=True).select_related('task').order_by('pk'))
+        if not events:
+            return 0
+        user_ids = _existing_user_ids(events)
+        counts = defaultdict(int)
+        task_names = defaultdict(list)
+        senders = {}
+        for event in events:
+            for recipient_id in event.recipient_ids:
+                if recipient_id not in user_ids:
+                    continue
+                counts[recipient_id] += 1
+                senders[recipient_id] = event.sender_id
+                if event.task is not None and event.task.name not in task_names[recipient_id]:
+                    task_names[recipient_id].append(event.task.name)
+        _create([
+            Notifications(recipient_id=recipient_id, sender_id=senders[recipient_id], count=count,
+                          message=digest_message(count, task_names[recipient_id]), kind=Notifications.Kind.DIGEST)
+            for recipient_id, count in counts.items()
+        ])
+        NotificationOutbox.objects.filter(pk__in=[event.pk for event in events]).delete()
+    return len(counts)
+
+
+def prune(cutoff, batch_size=1000, archive=True, after_pk=0):
+    """Removes a batch of notifications from before the cutoff, archiving them unless told not to.
+
+    Walks the table in primary key order from after_pk, so each batch is a short transaction on rows no
+    inbox holds a lock on. Returns the last primary key looked at, or None when there is nothing left,
+    and how many notifications were removed."""
+    with transaction.atomic():
+        batch = list(Notifications.objects.select_for_update(skip_locked=True)
+                     .filter(pk__gt=after_pk, timestamp__lt=cutoff).order_by('pk')[:batch_size])
+        if not batch:
+            return None, 0
+        if archive:
+            ArchivedNotification.objects.bulk_create([
+                ArchivedNotification(notification_id=notification.pk, recipient_id=notification.recipient_id,
+                                     sender_id=notification.sender_id, task_id=notification.task_id,
+                                     message=notification.message, kind=notification.kind, count=notification.count,
+                                     timestamp=notification.timestamp, read_at=notification.read_at)
+                for notification in batch
+            ], ignore_conflicts=True)
+        Notifications.objects.filter(pk__in=[notification.pk for notification in batch]).delete()
+        adjust_unread({recipient_id: -count for recipient_id, count in
+                       Counter(notification.recipient_id for notification in batch
+                               if notification.read_at is None).items()})
+    return batch[-1].pk, len(batch)
+
+
+def outbox_metrics():
+    """Returns the number of events queued for the worker, the age in seconds of the oldest one and the number
+    of events whose delivery failed"""
+    queued = Q(failed_at__isnull=True)
+    metrics = NotificationOutbox.objects.filter(digest=False).aggregate(
+        oldest=Min('created_at', filter=queued), depth=Count('pk', filter=queued), failed=Count('pk', filter=~queued))
+    oldest = metrics['oldest']
+    return {
+        'depth': metrics['depth'],
+        'oldest_age': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+        'failed': metrics['failed'],
+    }
@@ -0,0 +1,110 @@
+"""Keyset (cursor) pagination for the tasks app"""
+from datetime import datetime
+from functools import reduce
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'tasks.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor is tampered with or was made for a different ordering."""
+
+
+class KeysetPage:
+    """A page of results, with opaque cursors for the pages either side of it."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginates by seeking past the last (sort value, id) seen instead of using OFFSET, so deep pages stay cheap."""
+
+    def __init__(self, queryset, sort_field, per_page, descending=False):
+        self.queryset = queryset
+        self.sort_field = sort_field
+        self.per_page = per_page
+        self.descending = descending
+
+    @property
+    def ordering(self):
+        return f'{"-" if self.descending else ""}{self.sort_field}'
+
+    def _sort_value(self, obj):
+        """Returns the value of the sort field for an object, following relations such as author__username"""
+        return reduce(getattr, self.sort_field.split('__'), obj)
+
+    def encode_cursor(self, obj, direction):
+        """Returns an opaque token for the position of an object, to page forwards ('next') or backwards ('previous')"""
+        value = self._sort_value(obj)
+        if isinstance(value, datetime):
+            value = {'datetime': value.isoformat()}
+        return signing.dumps({'o': self.ordering, 'v': value, 'id': obj.pk, 'd': direction}, salt=CURSOR_SALT)
+
+    def decode_cursor(self, cursor):
+        """Returns the sort value, id and direction a cursor points at"""
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise InvalidCursor('The cursor is invalid.')
+        if data.get('o') != self.ordering or data.get('d') not in ('next', 'previous'):
+            raise InvalidCursor('The cursor belongs to a different ordering.')
+        value = data['v']
+        if isinstance(value, dict):
+            value = parse_datetime(value['datetime'])
+        return value, data['id'], data['d']
+
+    def _seek(self, value, pk, forwards):
+        """Filters to rows strictly after (value, pk) in the direction of travel"""
+        lookup = 'gt' if forwards != self.descending else 'lt'
+        return (Q(**{f'{self.sort_field}__{lookup}': value})
+                | Q(**{self.sort_field: value, f'pk__{lookup}': pk}))
+
+    def page(self, cursor=None):
+        """Returns the page the cursor points at, or the first page if there is no cursor"""
+        direction = 'next'
+        queryset = self.queryset
+        if cursor:
+            value, pk, direction = self.decode_cursor(cursor)
+            queryset = queryset.filter(self._seek(value, pk, direction == 'next'))
+
+        forwards = direction == 'next'
+        if forwards == self.descending:
+            ordering = (f'-{self.sort_field}', '-pk')
+        else:
+            ordering = (self.sort_field, 'pk')
+        # One extra row tells us whether there is another page without counting
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forwards:
+            rows.reverse()
+
+        # Coming from a cursor means there are rows behind us; the extra row says whether there are more ahead
+        if forwards:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            has_next, has_previous = bool(cursor), has_more
+        next_cursor = self.encode_cursor(rows[-1], 'next') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'previous') if rows and has_previous else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
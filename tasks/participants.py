@@ -0,0 +1,61 @@
+"""Upkeep of the TaskParticipant table for the tasks app"""
+from collections import namedtuple
+
+from tasks.models import Task, TaskParticipant
+
+# Differences between the participant rows of some tasks and what their tasks say they should be
+ParticipantDiff = namedtuple('ParticipantDiff', ['missing', 'changed', 'extra'])
+
+
+def expected_participants(task_ids):
+    """Returns what the participant rows of the tasks should hold, keyed by (user id, task id)"""
+    tasks = {pk: (author_id, deadline, priority) for pk, author_id, deadline, priority in
+             Task.objects.filter(pk__in=task_ids).values_list('pk', 'author_id', 'deadline', 'priority')}
+    roles = {(author_id, pk): TaskParticipant.Role.AUTHOR for pk, (author_id, _, _) in tasks.items()}
+    for user_id, task_id in Task.members.through.objects.filter(task_id__in=tasks).values_list('user_id', 'task_id'):
+        roles[user_id, task_id] = roles.get((user_id, task_id), 0) | TaskParticipant.Role.MEMBER
+    return {key: (role, *tasks[key[1]][1:]) for key, role in roles.items()}
+
+
+def diff_participants(task_ids):
+    """Compares the participant rows of the tasks with their authors, members, deadlines and priorities"""
+    expected = expected_participants(task_ids)
+    missing, changed, extra = [], [], []
+    rows = TaskParticipant.objects.filter(task_id__in=task_ids).values_list('pk', 'user_id', 'task_id', 'role',
+                                                                           'deadline', 'priority')
+    for pk, user_id, task_id, *values in rows:
+        expected_values = expected.pop((user_id, task_id), None)
+        if expected_values is None:
+            extra.append(TaskParticipant(pk=pk, user_id=user_id, task_id=task_id, role=values[0], deadline=values[1],
+                                         priority=values[2]))
+        elif expected_values != tuple(values):
+            role, deadline, priority = expected_values
+            changed.append(TaskParticipant(pk=pk, user_id=user_id, task_id=task_id, role=role, deadline=deadline,
+                                           priority=priority))
+    missing = [TaskParticipant(user_id=user_id, task_id=task_id, role=role, deadline=deadline, priority=priority)
+               for (user_id, task_id), (role, deadline, priority) in expected.items()]
+    return ParticipantDiff(missing, changed, extra)
+
+
+def sync_participants(task_ids):
+    """Brings the participant rows of the tasks in line with the tasks, returning the differences it fixed"""
+    diff = diff_participants(task_ids)
+    if diff.extra:
+        TaskParticipant.objects.filter(pk__in=[participant.pk for participant in diff.extra]).delete()
+    if diff.changed:
+        TaskParticipant.objects.bulk_update(diff.changed, ['role', 'deadline', 'priority'])
+    if diff.missing:
+        # Tolerates a concurrent sync of the same task having added the row already
+        TaskParticipant.objects.bulk_create(diff.missing, ignore_conflicts=True)
+    return diff
+
+
+def task_batches(batch_size):
+    """Yields the ids of every task, a batch at a time in primary key order"""
+    last_pk = 0
+    while True:
+        batch = list(Task.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
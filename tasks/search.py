@@ -0,0 +1,209 @@
+"""Task search for the tasks app"""
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connection
+from django.db.models import Case, F, FloatField, Func, Q, Value, When
+from django.db.models.functions import Cast
+
+from tasks.models import Task
+
+SEARCH_CONFIG = 'english'
+
+NO_RANK = Value(0.0, output_field=FloatField())
+
+# The description's part of the stored vector, which holds it at weight B
+DESCRIPTION_VECTOR = Func(F('search_vector'), function='ts_filter', template="%(function)s(%(expressions)s, '{b}')",
+                          output_field=SearchVectorField())
+
+
+class PostgresSearchEngine:
+    """Full-text search on the stored, GIN-indexed search vector, for PostgreSQL.
+
+    The vector weighs names above descriptions and is kept current by a database trigger, so it also follows
+    bulk creates and QuerySet.update() calls."""
+
+    def index_task(self, task):
+        """Nothing to do, the trigger has already updated the vector"""
+
+    def remove_task(self, task_pk):
+        """Nothing to do, the vector is deleted with the row"""
+
+    def search(self, tasks, field, query, ranked=False):
+        """Filters tasks to those matching the query on a TaskSortForm filter field, annotated with their relevance"""
+        if not query:
+            return tasks.annotate(relevance=NO_RANK)
+        if field == 'author__username':
+            return tasks.filter(author__username__icontains=query).annotate(relevance=NO_RANK)
+
+        # Descriptions use full-text search on the GIN-indexed vector, rechecked against the description's own
+        # lexemes as the vector covers the name too; names keep substring matching, which the trigram indexes
+        # serve where pg_trgm is available
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        if field == 'name':
+            matches = Q(name__icontains=query)
+        else:
+            tasks = tasks.alias(description_vector=DESCRIPTION_VECTOR)
+            matches = Q(search_vector=search_query) & Q(description_vector=search_query)
+        # ts_rank returns a real, which a cursor could not hold exactly; a double round-trips through it unchanged
+        rank = Cast(SearchRank(F('search_vector'), search_query), FloatField())
+        return tasks.filter(matches).annotate(relevance=rank)
+
+
+class InMemorySearchEngine:
+    """In-process inverted index of task tokens, for SQLite and test runs.
+
+    The index is built on first use and then kept current through the Task signals, so it only sees
+    changes made by this process."""
+
+    fields = ['name', 'description', 'author__username']
+    # Relevance of a matching token in each field, mirroring the name and description vector weights
+    weights = {'name': 1.0, 'description': 0.4, 'author__username': 0.0}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = False
+        # field -> token -> ids of the tasks containing it
+        self.postings = {field: defaultdict(set) for field in self.fields}
+        # task id -> field -> lower-cased text, used to verify substring matches and drop stale postings
+        self.documents = {}
+
+    @staticmethod
+    def tokenize(text):
+        return re.findall(r'\w+', text.lower())
+
+    def rebuild(self):
+        """Indexes every task from scratch with a single query"""
+        with self.lock:
+            self.postings = {field: defaultdict(set) for field in self.fields}
+            self.documents = {}
+            for task_pk, *values in Task.objects.values_list('pk', *self.fields).iterator():
+                self._add(task_pk, dict(zip(self.fields, values)))
+            self.built = True
+
+    def _add(self, task_pk, values):
+        document = {field: (values[field] or '').lower() for field in self.fields}
+        self.documents[task_pk] = document
+        for field, text in document.items():
+            for token in self.tokenize(text):
+                self.postings[field][token].add(task_pk)
+
+    def _remove(self, task_pk):
+        document = self.documents.pop(task_pk, None)
+        if document is None:
+            return
+        for field, text in document.items():
+            for token in set(self.tokenize(text)):
+                postings = self.postings[field].get(token)
+                if postings is not None:
+                    postings.discard(task_pk)
+                    if not postings:
+                        del self.postings[field][token]
+
+    def index_task(self, task):
+        """Replaces the task's postings with its current name, description and author"""
+        if not self.built:
+            return
+        values = {'name': task.name, 'description': task.description, 'author__username': task.author.username}
+        with self.lock:
+            self._remove(task.pk)
+            self._add(task.pk, values)
+
+    def remove_task(self, task_pk):
+        """Drops a deleted task's postings"""
+        if not self.built:
+            return
+        with self.lock:
+            self._remove(task_pk)
+
+    def reindex_author(self, user):
+        """Updates the author username of every task the user wrote"""
+        if not self.built:
+            return
+        task_pks = list(Task.objects.filter(author=user).values_list('pk', flat=True))
+        with self.lock:
+            for task_pk in task_pks:
+                document = self.documents.get(task_pk)
+                if document is not None:
+                    self._remove(task_pk)
+                    self._add(task_pk, dict(document, author__username=user.username))
+
+    def _matching_tokens(self, field, query_token, substring):
+        """Returns the indexed tokens a query token matches: those containing it, or starting with it"""
+        if substring:
+            return [token for token in self.postings[field] if query_token in token]
+        return [token for token in self.postings[field] if token.startswith(query_token)]
+
+    def match(self, field, query):
+        """Returns the ids of matching tasks with a relevance score for each"""
+        if not self.built:
+            self.rebuild()
+        query = query.lower()
+        query_tokens = self.tokenize(query)
+        if not query_tokens:
+            return {}
+        # Names and usernames match substrings; descriptions match words, and rank higher when the name has them too
+        boosted_fields = ['name'] if field == 'description' else []
+        substring = field != 'description'
+        scores = None
+        with self.lock:
+            # Every query token has to match, as in a websearch query
+            for query_token in query_tokens:
+                token_scores = Counter()
+                for token in self._matching_tokens(field, query_token, substring):
+                    for task_pk in self.postings[field][token]:
+                        token_scores[task_pk] += self.weights[field]
+                for boosted_field in boosted_fields:
+                    for token in self._matching_tokens(boosted_field, query_token, substring):
+                        for task_pk in self.postings[boosted_field][token]:
+                            if task_pk in token_scores:
+                                token_scores[task_pk] += self.weights[boosted_field]
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {task_pk: scores[task_pk] + score for task_pk, score in token_scores.items()
+                              if task_pk in scores}
+            if substring:
+                # Tokens narrow down the candidates, but the whole query still has to appear in the text
+                scores = {task_pk: score for task_pk, score in scores.items()
+                          if query in self.documents[task_pk][field]}
+        return scores
+
+    def search(self, tasks, field, query, ranked=False):
+        """Filters tasks to those matching the query on a TaskSortForm filter field, annotated with their relevance"""
+        if not query:
+            return tasks.annotate(relevance=NO_RANK)
+        scores = self.match(field, query)
+        if not scores:
+            return tasks.none().annotate(relevance=NO_RANK)
+        tasks = tasks.filter(pk__in=scores.keys())
+        if not ranked:
+            # Passing every score back to the database is costly, so only do it when ordering by them
+            return tasks.annotate(relevance=NO_RANK)
+        relevance = Case(*[When(pk=task_pk, then=Value(score)) for task_pk, score in scores.items()],
+                         default=NO_RANK, output_field=FloatField())
+        return tasks.annotate(relevance=relevance)
+
+
+ENGINES = {
+    'postgresql': PostgresSearchEngine,
+    'memory': InMemorySearchEngine,
+}
+_engines = {}
+
+
+def get_search_engine():
+    """Returns the engine named by the TASK_SEARCH_ENGINE setting, by default the one suiting the database"""
+    default = 'postgresql' if connection.vendor == 'postgresql' else 'memory'
+    name = getattr(settings, 'TASK_SEARCH_ENGINE', None) or default
+    if name not in _engines:
+        _engines[name] = ENGINES[name]()
+    return _engines[name]
+
+
+def search_tasks(tasks, field, query, ranked=False):
+    """Filters tasks with the configured search engine; relevance is only guaranteed to be computed when ranked"""
+    return get_search_engine().search(tasks, field, query, ranked=ranked)
@@ -0,0 +1,105 @@
+"""Signal handlers for the tasks app"""
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from tasks.dashboard import invalidate_dashboards
+from tasks.models import Notifications, Task, User
+from tasks.notifications import adjust_unread
+from tasks.participants import sync_participants
+from tasks.search import get_search_engine
+
+
+@receiver(post_save, sender=Task)
+def index_task(sender, instance, **kwargs):
+    """Keeps the task's search index entry in step with its name and description"""
+    get_search_engine().index_task(instance)
+
+
+@receiver(post_delete, sender=Task)
+def unindex_task(sender, instance, **kwargs):
+    """Drops a deleted task from the search index"""
+    get_search_engine().remove_task(instance.pk)
+
+
+@receiver(post_save, sender=Task)
+def sync_task_participants(sender, instance, **kwargs):
+    """Keeps the task's participant rows in step with its author, deadline and priority"""
+    sync_participants([instance.pk])
+
+
+@receiver(m2m_changed, sender=Task.members.through)
+def sync_member_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keeps participant rows in step with task members, changed from either side of the relation"""
+    if action == 'pre_clear' and reverse:
+        # The tasks are gone from the relation once it is cleared, so note them beforehand
+        instance._cleared_task_ids = list(Task.objects.filter(members=instance).values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            task_ids = [instance.pk]
+        elif action == 'post_clear':
+            task_ids = instance.__dict__.pop('_cleared_task_ids', [])
+        else:
+            task_ids = list(pk_set)
+        if task_ids:
+            sync_participants(task_ids)
+
+
+def _member_ids(task):
+    return Task.members.through.objects.filter(task_id=task.pk).values_list('user_id', flat=True)
+
+
+@receiver(post_save, sender=Task)
+def invalidate_task_dashboards(sender, instance, created, **kwargs):
+    """Drops the cached dashboards of the task's members when its name or deadline may have changed"""
+    if not created:
+        invalidate_dashboards(_member_ids(instance))
+
+
+@receiver(pre_delete, sender=Task)
+def invalidate_deleted_task_dashboards(sender, instance, **kwargs):
+    """Drops the cached dashboards of a deleted task's members"""
+    invalidate_dashboards(_member_ids(instance))
+
+
+@receiver(m2m_changed, sender=Task.members.through)
+def invalidate_member_dashboards(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drops the cached dashboards of users joining or leaving tasks, changed from either side of the relation"""
+    if action == 'pre_clear' and not reverse:
+        # The members are gone from the relation once it is cleared, so note them beforehand
+        instance._cleared_member_ids = list(_member_ids(instance))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            user_ids = [instance.pk]
+        elif action == 'post_clear':
+            user_ids = instance.__dict__.pop('_cleared_member_ids', [])
+        else:
+            user_ids = pk_set
+        invalidate_dashboards(user_ids)
+
+
+@receiver(post_save, sender=User)
+def reindex_authored_tasks(sender, instance, created, **kwargs):
+    """Keeps author usernames in the search index up to date"""
+    engine = get_search_engine()
+    if not created and hasattr(engine, 'reindex_author'):
+        engine.reindex_author(instance)
+
+
+def _uncount_unread(notifications):
+    """Takes unread notifications about to be deleted off their recipients' counters"""
+    unread = (notifications.filter(read_at__isnull=True).order_by()
+              .values('recipient').annotate(count=Count('pk')))
+    adjust_unread({row['recipient']: -row['count'] for row in unread})
+
+
+@receiver(pre_delete, sender=Task)
+def uncount_task_notifications(sender, instance, **kwargs):
+    """Keeps unread counters right when a task's notifications are deleted with it"""
+    _uncount_unread(Notifications.objects.filter(task=instance))
+
+
+@receiver(pre_delete, sender=User)
+def uncount_sent_notifications(sender, instance, **kwargs):
+    """Keeps unread counters right when a user's sent notifications are deleted with them"""
+    _uncount_unread(Notifications.objects.filter(sender=instance).exclude(recipient=instance))
@@ -4,6 +4,7 @@ from django import forms
 from django.test import TestCase
 from tasks.forms import CreateTaskForm1, CreateTaskForm2
 from tasks.models import Task, User, Team
+from tasks.tests.helpers import create_users
 from datetime import datetime
 from django.utils import timezone
 
@@ -69,3 +70,22 @@ class CreateTaskFormTestCase(TestCase):
         form = CreateTaskForm2(user=self.user, team=None, data=self.form2_input)
         form.full_clean()
         self.assertFalse(form.is_valid())
+
+    def test_members_must_be_in_team(self):
+        """Checks that members from outside the team are rejected"""
+
+        outsider = User.objects.create_user(username='@outsider', password='Password123',
+                                            email='outsider@example.org')
+        form = CreateTaskForm2(user=self.user, team=self.team, data={'members': [self.user.pk, outsider.pk]})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['members'], ["Members must be in the specified team!"])
+
+    def test_membership_is_checked_in_one_query(self):
+        """Checks that validating many members takes a single query"""
+
+        users = create_users('member', 20)
+        self.team.team_members.add(*users)
+        form = CreateTaskForm2(user=self.user, team=self.team,
+                               data={'members': [self.user.pk] + [user.pk for user in users]})
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
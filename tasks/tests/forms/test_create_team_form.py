@@ -72,3 +72,11 @@ class TeamFormTestCase(TestCase):
         self.assertFalse(form.is_valid())
         self.assertFormError(form, 'team_name', 'Team with this Team name already exists.')
 
+
+    def test_member_picker_renders_only_picked_users(self):
+        """Ensures the member picker renders the picked users without loading everyone"""
+        form = TeamCreateForm(data={'team_name': 'TestTeam', 'team_members': ['@janedoe']}, user=self.user)
+        with self.assertNumQueries(0):
+            html = str(form['team_members'])
+        self.assertIn('value="@janedoe"', html)
+        self.assertNotIn('@johndoe', html)
@@ -0,0 +1,44 @@
+"""Unit tests of the modify task members form."""
+from django.test import TestCase
+from tasks.forms import ModifyTaskMembersForm
+from tasks.models import Task, Team, User
+from tasks.tests.helpers import create_users
+
+
+class ModifyTaskMembersFormTestCase(TestCase):
+    """Unit tests of the modify task members form."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+        'tasks/tests/fixtures/default_team.json',
+        'tasks/tests/fixtures/default_task.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.team = Team.objects.get(team_name='Default Team')
+        self.task = Task.objects.get(pk=1)
+        self.outsider = User.objects.get(username='@peterpickles')
+        self.users = create_users('member', 20)
+        self.team.team_members.add(*self.users)
+
+    def test_only_team_members_can_be_added(self):
+        """Tests that people outside the team cannot be added to the task"""
+        form = ModifyTaskMembersForm({'add_members': [self.outsider.pk]}, instance=self.task)
+        self.assertFalse(form.is_valid())
+        self.assertIn('add_members', form.errors)
+
+    def test_only_assigned_members_can_be_removed(self):
+        """Tests that only members of the task can be removed from it"""
+        form = ModifyTaskMembersForm({'remove_members': [self.users[0].pk]}, instance=self.task)
+        self.assertFalse(form.is_valid())
+        self.assertIn('remove_members', form.errors)
+
+    def test_members_are_checked_in_one_query_per_field(self):
+        """Tests that validating many members takes a single query for each field"""
+        self.task.members.set(self.users[:10])
+        form = ModifyTaskMembersForm({'add_members': [user.pk for user in self.users[10:]],
+                                      'remove_members': [user.pk for user in self.users[:10]]}, instance=self.task)
+        with self.assertNumQueries(2):
+            self.assertTrue(form.is_valid())
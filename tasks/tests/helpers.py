@@ -1,6 +1,9 @@
 from django.urls import reverse
 from with_asserts.mixin import AssertHTMLMixin
 
+from tasks.models import User
+
+
 def reverse_with_next(url_name, next_url):
     """Extended version of reverse to generate URLs with redirects"""
     url = reverse(url_name)
@@ -8,6 +11,12 @@ def reverse_with_next(url_name, next_url):
     return url
 
 
+def create_users(prefix, count, **fields):
+    """Creates users @<prefix>0 to @<prefix><count - 1> with a single INSERT, returning them"""
+    return User.objects.bulk_create([User(username=f'@{prefix}{i}', email=f'{prefix}{i}@example.org', **fields)
+                                     for i in range(count)])
+
+
 class LogInTester:
     """Class support login in tests."""
  
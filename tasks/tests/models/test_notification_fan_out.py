@@ -0,0 +1,112 @@
+"""Unit tests for the notification fan-out service"""
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from tasks.models import Notifications, Task, Team, User
+from tasks.notifications import notify
+from tasks.tests.helpers import create_users
+
+
+class NotifyTestCase(TestCase):
+    """Unit tests for the notification fan-out service"""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+    ]
+
+    def setUp(self):
+        self.sender = User.objects.get(username='@johndoe')
+        self.recipients = create_users('member', 40)
+        self.team = Team.objects.create(team_name='Test Team', team_admin=self.sender)
+        self.task = Task.objects.create(name='Test Task', description='A task', deadline='2030-01-01T00:00:00Z',
+                                        author=self.sender, team=self.team)
+
+    def test_notifies_every_recipient_with_one_query(self):
+        """Test that a list of recipients is notified with a single INSERT, plus one UPDATE of their unread counters"""
+        with self.assertNumQueries(2):
+            notify(self.recipients, self.sender, 'Hello', task=self.task)
+        notifications = Notifications.objects.filter(message='Hello')
+        self.assertEqual(notifications.count(), 40)
+        self.assertTrue(all(notification.task == self.task for notification in notifications))
+
+    def test_notifies_queryset_without_loading_users(self):
+        """Test that a queryset of recipients costs one query for the ids, one INSERT and one counter UPDATE"""
+        recipients = User.objects.filter(username__startswith='@member')
+        with self.assertNumQueries(3):
+            notify(recipients, self.sender, 'Hello')
+        self.assertEqual(Notifications.objects.filter(message='Hello', sender=self.sender).count(), 40)
+
+    def test_recipients_notified_once(self):
+        """Test that a recipient given twice only gets one notification"""
+        notify([self.recipients[0], self.recipients[0]], self.sender, 'Hello')
+        self.assertEqual(Notifications.objects.filter(recipient=self.recipients[0]).count(), 1)
+
+    def test_no_recipients(self):
+        """Test that nothing is written when there is nobody to notify"""
+        with self.assertNumQueries(0):
+            self.assertEqual(notify([], self.sender, 'Hello'), [])
+
+    def test_repeated_events_coalesce(self):
+        """Test that repeats of a coalesced kind about the same task merge into one notification per recipient"""
+        for i in range(3):
+            notify(self.recipients[:2], self.sender, f'Edit {i}', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        notifications = Notifications.objects.filter(kind=Notifications.Kind.TASK_MODIFIED)
+        self.assertEqual(notifications.count(), 2)
+        self.assertTrue(all(notification.count == 3 and notification.message == 'Edit 2'
+                            for notification in notifications))
+
+    def test_coalescing_only_merges_with_recipients_who_have_one(self):
+        """Test that a recipient without an earlier notification gets a new one while the others merge"""
+        notify(self.recipients[:1], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        notify(self.recipients[:2], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        counts = dict(Notifications.objects.values_list('recipient_id', 'count'))
+        self.assertEqual(counts, {self.recipients[0].pk: 2, self.recipients[1].pk: 1})
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=60)
+    def test_coalescing_window(self):
+        """Test that events outside the coalescing window start a new notification"""
+        notify(self.recipients[:1], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        Notifications.objects.update(timestamp=timezone.now() - timedelta(minutes=2))
+        notify(self.recipients[:1], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        self.assertEqual(list(Notifications.objects.values_list('count', flat=True)), [1, 1])
+
+    def test_other_kinds_do_not_coalesce(self):
+        """Test that kinds which are not coalesced, or other tasks, always get their own notification"""
+        other_task = Task.objects.create(name='Other Task', description='A task', deadline='2030-01-01T00:00:00Z',
+                                         author=self.sender, team=self.team)
+        notify(self.recipients[:1], self.sender, 'Assigned', task=self.task, kind=Notifications.Kind.TASK_ASSIGNED)
+        notify(self.recipients[:1], self.sender, 'Assigned', task=self.task, kind=Notifications.Kind.TASK_ASSIGNED)
+        notify(self.recipients[:1], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        notify(self.recipients[:1], self.sender, 'Edit', task=other_task, kind=Notifications.Kind.TASK_MODIFIED)
+        self.assertEqual(Notifications.objects.count(), 4)
+
+    def test_read_notifications_do_not_coalesce(self):
+        """Test that an event after the recipient read the earlier one starts a new notification"""
+        notify(self.recipients[:1], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        Notifications.objects.update(read_at=timezone.now())
+        notify(self.recipients[:1], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        self.assertEqual(Notifications.objects.filter(read_at__isnull=True, count=1).count(), 1)
+        self.assertEqual(Notifications.objects.count(), 2)
+
+
+class NotifyTransactionTestCase(TransactionTestCase):
+    """Unit tests of the notification fan-out outside a test transaction"""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+    ]
+
+    def test_notifications_and_counters_commit_together(self):
+        """Test that the notifications are not kept if their unread counters cannot be updated"""
+        sender = User.objects.get(username='@johndoe')
+        recipient = User.objects.get(username='@janedoe')
+        with mock.patch('tasks.notifications.adjust_unread', side_effect=DatabaseError('counter update failed')):
+            with self.assertRaises(DatabaseError):
+                notify([recipient], sender, 'Hello')
+        self.assertFalse(Notifications.objects.exists())
@@ -0,0 +1,180 @@
+"""Unit tests for the notification outbox and its worker"""
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks.models import NotificationOutbox, Notifications, Task, Team, User
+from tasks import notifications
+from tasks.notifications import drain_outbox, notify, outbox_metrics, send_digests
+from tasks.tests.helpers import create_users
+
+
+@override_settings(NOTIFICATION_DELIVERY='outbox')
+class NotificationOutboxTestCase(TestCase):
+    """Unit tests for the notification outbox and its worker"""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+    ]
+
+    def setUp(self):
+        self.sender = User.objects.get(username='@johndoe')
+        self.recipients = create_users('member', 40)
+        self.team = Team.objects.create(team_name='Test Team', team_admin=self.sender)
+        self.task = Task.objects.create(name='Test Task', description='A task', deadline='2030-01-01T00:00:00Z',
+                                        author=self.sender, team=self.team)
+
+    def test_notify_queues_one_event(self):
+        """Test that notifying many recipients only writes a single outbox row"""
+        with self.assertNumQueries(1):
+            notify(self.recipients, self.sender, 'Hello', task=self.task)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertFalse(Notifications.objects.exists())
+
+    def test_drain_delivers_events(self):
+        """Test that draining writes every queued notification and empties the outbox"""
+        notify(self.recipients, self.sender, 'Hello', task=self.task)
+        notify(self.recipients[:2], self.sender, 'Bye')
+        delivered, latencies = drain_outbox()
+        self.assertEqual(delivered, 2)
+        self.assertEqual(len(latencies), 2)
+        self.assertEqual(Notifications.objects.filter(message='Hello', task=self.task).count(), 40)
+        self.assertEqual(Notifications.objects.filter(message='Bye', task=None).count(), 2)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(drain_outbox(), (0, []))
+
+    def test_drain_in_batches(self):
+        """Test that each drain delivers at most a batch of events, oldest first"""
+        for i in range(3):
+            notify(self.recipients[:1], self.sender, f'Message {i}')
+        self.assertEqual(drain_outbox(batch_size=2)[0], 2)
+        self.assertEqual(list(NotificationOutbox.objects.values_list('message', flat=True)), ['Message 2'])
+
+    def test_event_survives_task_deletion(self):
+        """Test that an event for a task deleted before delivery is still delivered, without the task"""
+        notify(self.recipients[:1], self.sender, 'Hello', task=self.task)
+        self.task.delete()
+        drain_outbox()
+        self.assertTrue(Notifications.objects.filter(message='Hello', task=None).exists())
+
+    def test_drain_skips_deleted_recipients(self):
+        """Test that recipients deleted after an event was queued are left out rather than failing the batch"""
+        notify(self.recipients[:3], self.sender, 'Hello')
+        notify(self.recipients[2:3], self.sender, 'Only to the deleted user')
+        self.recipients[2].delete()
+        self.assertEqual(drain_outbox()[0], 2)
+        self.assertEqual(Notifications.objects.filter(message='Hello').count(), 2)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_failed_event_does_not_block_queue(self):
+        """Test that an event that cannot be written is set aside while the rest of the batch is delivered"""
+        notify(self.recipients[:1], self.sender, 'Before')
+        notify(self.recipients[:1], self.sender, 'Bad')
+        notify(self.recipients[:1], self.sender, 'After')
+        create = notifications._create
+
+        def failing_create(rows):
+            if any(row.message == 'Bad' for row in rows):
+                raise IntegrityError('bad event')
+            return create(rows)
+
+        with mock.patch('tasks.notifications._create', side_effect=failing_create), \
+                self.assertLogs('tasks.notifications', level='ERROR'):
+            self.assertEqual(drain_outbox()[0], 3)
+        self.assertEqual(sorted(Notifications.objects.values_list('message', flat=True)), ['After', 'Before'])
+        failed = NotificationOutbox.objects.get()
+        self.assertEqual(failed.message, 'Bad')
+        self.assertIsNotNone(failed.failed_at)
+        self.assertEqual(failed.error, 'bad event')
+        self.assertEqual(drain_outbox(), (0, []))
+        self.assertEqual(outbox_metrics()['failed'], 1)
+
+    def test_worker_logs_errors(self):
+        """Test that the worker logs errors instead of crashing"""
+        with mock.patch('tasks.management.commands.notification_worker.drain_outbox',
+                        side_effect=IntegrityError('broken')), \
+                self.assertLogs('tasks.notifications', level='ERROR') as logs:
+            call_command('notification_worker', '--once', stdout=StringIO())
+        self.assertIn('Could not drain the notification outbox', logs.output[0])
+
+    def test_outbox_metrics(self):
+        """Test that the metrics give the queue depth and the age of the oldest event"""
+        self.assertEqual(outbox_metrics(), {'depth': 0, 'oldest_age': 0.0, 'failed': 0})
+        notify(self.recipients[:1], self.sender, 'Hello')
+        notify(self.recipients[:1], self.sender, 'Hello again')
+        NotificationOutbox.objects.filter(message='Hello').update(created_at=timezone.now() - timedelta(minutes=1))
+        metrics = outbox_metrics()
+        self.assertEqual(metrics['depth'], 2)
+        self.assertGreaterEqual(metrics['oldest_age'], 60)
+
+    def test_worker_command_drains_outbox(self):
+        """Test that the worker delivers everything queued and reports what it did"""
+        notify(self.recipients, self.sender, 'Hello')
+        out = StringIO()
+        call_command('notification_worker', '--once', stdout=out)
+        self.assertIn('delivered=1', out.getvalue())
+        self.assertIn('depth=0', out.getvalue())
+        self.assertEqual(Notifications.objects.count(), 40)
+
+    def test_worker_command_metrics(self):
+        """Test that the worker prints the outbox metrics without delivering anything"""
+        notify(self.recipients, self.sender, 'Hello')
+        out = StringIO()
+        call_command('notification_worker', '--metrics', stdout=out)
+        self.assertIn('depth=1', out.getvalue())
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+    @override_settings(NOTIFICATION_DELIVERY='immediate')
+    def test_immediate_delivery_skips_outbox(self):
+        """Test that immediate delivery writes the notifications without queueing them"""
+        notify(self.recipients, self.sender, 'Hello')
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(Notifications.objects.count(), 40)
+
+    def test_drain_coalesces_events(self):
+        """Test that queued repeats of a coalesced kind are merged when delivered"""
+        for i in range(3):
+            notify(self.recipients[:2], self.sender, f'Edit {i}', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        drain_outbox()
+        self.assertEqual(sorted(Notifications.objects.values_list('count', flat=True)), [3, 3])
+
+    @override_settings(NOTIFICATION_DIGEST_KINDS=[Notifications.Kind.TASK_MODIFIED])
+    def test_digest(self):
+        """Test that events held for the digest become one summary per recipient, untouched by the worker"""
+        other_task = Task.objects.create(name='Other Task', description='A task', deadline='2030-01-01T00:00:00Z',
+                                         author=self.sender, team=self.team)
+        for task in (self.task, self.task, other_task):
+            notify(self.recipients[:2], self.sender, 'Edit', task=task, kind=Notifications.Kind.TASK_MODIFIED)
+        notify(self.recipients[:1], self.sender, 'Hello')
+
+        self.assertEqual(drain_outbox()[0], 1)
+        self.assertEqual(outbox_metrics()['depth'], 0)
+        self.assertEqual(send_digests(), 2)
+
+        digests = Notifications.objects.filter(kind=Notifications.Kind.DIGEST)
+        self.assertEqual(digests.count(), 2)
+        for digest in digests:
+            self.assertEqual(digest.count, 3)
+            self.assertEqual(digest.message, 'Digest: 3 updates to Test Task, Other Task.')
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    @override_settings(NOTIFICATION_DIGEST_KINDS=[Notifications.Kind.TASK_MODIFIED])
+    def test_digest_skips_deleted_recipients(self):
+        """Test that no digest is written for recipients deleted since their events were held"""
+        notify(self.recipients[:2], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        self.recipients[1].delete()
+        self.assertEqual(send_digests(), 1)
+        self.assertEqual(list(Notifications.objects.values_list('recipient', flat=True)), [self.recipients[0].pk])
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_digest_command(self):
+        """Test that the digest command reports how many digests it sent"""
+        out = StringIO()
+        call_command('notification_digest', stdout=out)
+        self.assertIn('Sent 0 digests', out.getvalue())
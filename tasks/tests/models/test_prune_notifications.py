@@ -0,0 +1,84 @@
+"""Unit tests for pruning and archiving old notifications"""
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.models import ArchivedNotification, Notifications, Task, Team, User
+from tasks.notifications import notify, prune
+
+
+class PruneNotificationsTestCase(TestCase):
+    """Unit tests for pruning and archiving old notifications"""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+    ]
+
+    def setUp(self):
+        self.sender = User.objects.get(username='@johndoe')
+        self.recipient = User.objects.get(username='@janedoe')
+        self.team = Team.objects.create(team_name='Test Team', team_admin=self.sender)
+        self.task = Task.objects.create(name='Test Task', description='A task', deadline='2030-01-01T00:00:00Z',
+                                        author=self.sender, team=self.team)
+        for i in range(5):
+            notify([self.recipient], self.sender, f'Old {i}', task=self.task, kind=Notifications.Kind.TASK_ASSIGNED)
+        Notifications.objects.update(timestamp=timezone.now() - timedelta(days=100))
+        notify([self.recipient], self.sender, 'New')
+
+    def test_prune_archives_old_notifications(self):
+        """Test that notifications older than the cutoff move to the archive with their details"""
+        after_pk, pruned = prune(timezone.now() - timedelta(days=90))
+        self.assertEqual(pruned, 5)
+        self.assertIsNotNone(after_pk)
+        self.assertEqual(list(Notifications.objects.values_list('message', flat=True)), ['New'])
+        archived = ArchivedNotification.objects.get(message='Old 0')
+        self.assertEqual(archived.recipient, self.recipient)
+        self.assertEqual(archived.sender_id, self.sender.pk)
+        self.assertEqual(archived.task_id, self.task.pk)
+        self.assertEqual(archived.kind, Notifications.Kind.TASK_ASSIGNED)
+        self.assertEqual(prune(timezone.now() - timedelta(days=90), after_pk=after_pk), (None, 0))
+
+    def test_prune_in_batches(self):
+        """Test that each call prunes at most a batch, carrying on from where the last stopped"""
+        after_pk, pruned = prune(timezone.now() - timedelta(days=90), batch_size=2)
+        self.assertEqual(pruned, 2)
+        self.assertEqual(Notifications.objects.count(), 4)
+        self.assertEqual(prune(timezone.now() - timedelta(days=90), batch_size=2, after_pk=after_pk)[1], 2)
+
+    def test_prune_without_archiving(self):
+        """Test that notifications can be deleted outright"""
+        prune(timezone.now() - timedelta(days=90), archive=False)
+        self.assertEqual(Notifications.objects.count(), 1)
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    def test_prune_updates_unread_counter(self):
+        """Test that pruned unread notifications come off the recipient's unread count"""
+        Notifications.objects.filter(message='Old 0').update(read_at=timezone.now())
+        prune(timezone.now() - timedelta(days=90))
+        self.recipient.refresh_from_db()
+        self.assertEqual(self.recipient.unread_notifications, 2)
+
+    def test_archive_outlives_task(self):
+        """Test that archived notifications are kept when the task they mention is deleted"""
+        prune(timezone.now() - timedelta(days=90))
+        self.task.delete()
+        self.assertEqual(ArchivedNotification.objects.count(), 5)
+
+    def test_prune_command(self):
+        """Test that the command prunes everything past the retention period"""
+        out = StringIO()
+        call_command('prune_notifications', '--days', '90', '--batch-size', '2', stdout=out)
+        self.assertIn('Archived 5 notifications', out.getvalue())
+        self.assertEqual(Notifications.objects.count(), 1)
+        self.assertEqual(ArchivedNotification.objects.count(), 5)
+
+    def test_prune_command_delete(self):
+        """Test that the command can delete instead of archiving"""
+        out = StringIO()
+        call_command('prune_notifications', '--delete', stdout=out)
+        self.assertIn('Deleted 5 notifications', out.getvalue())
+        self.assertFalse(ArchivedNotification.objects.exists())
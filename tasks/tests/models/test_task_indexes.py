@@ -0,0 +1,89 @@
+"""Query plan regression tests for the task indexes."""
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.models import F, Q
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.models import Task, Team, User
+from tasks.search import search_tasks
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL')
+class TaskIndexTestCase(TestCase):
+    """Checks that the dashboard and task list queries can be answered from an index."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/default_team.json',
+        'tasks/tests/fixtures/default_task.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.team = Team.objects.get(team_name='Default Team')
+        # The test tables are tiny, so rule out sequential scans for the planner
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assert_uses_index(self, queryset, index_name=None):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan)
+        if index_name is not None:
+            self.assertIn(index_name, plan)
+
+    def test_member_deadline_queries_use_index(self):
+        """Test that the dashboard's upcoming and overdue queries use an index scan"""
+        today = timezone.now()
+        self.assert_uses_index(
+            Task.objects.filter(members=self.user, deadline__gte=today).order_by('deadline')[:10],
+            'task_members_user_task_idx')
+        self.assert_uses_index(
+            Task.objects.filter(members=self.user, deadline__lt=today).order_by('deadline')[:10],
+            'task_members_user_task_idx')
+
+    def test_participant_deadline_queries_use_index(self):
+        """Test that listing a user's tasks by deadline is a range scan of the participants index"""
+        self.assert_uses_index(
+            Task.objects.filter(participants__user=self.user, participants__deadline__gte=timezone.now())
+            .order_by('participants__deadline')[:10],
+            'task_participant_deadline_idx')
+        # The task list's deadline sort and its cursor seeks, on the user's participant row
+        tasks = Task.objects.filter(participants__user=self.user).annotate(
+            participant_deadline=F('participants__deadline'))
+        seek = Q(participant_deadline__gt=timezone.now()) | Q(participant_deadline=timezone.now(), pk__gt=1)
+        self.assert_uses_index(tasks.filter(seek).order_by('participant_deadline', 'pk')[:26],
+                               'task_participant_deadline_idx')
+        self.assert_uses_index(Task.objects.filter(participants__user=self.user), 'task_participant_deadline_idx')
+
+    def test_author_deadline_query_uses_index(self):
+        """Test that filtering by author and ordering by deadline uses the composite index"""
+        self.assert_uses_index(Task.objects.filter(author=self.user).order_by('deadline'), 'task_author_deadline_idx')
+
+    def test_team_deadline_query_uses_index(self):
+        """Test that filtering by team and ordering by deadline uses the composite index"""
+        self.assert_uses_index(Task.objects.filter(team=self.team).order_by('deadline'), 'task_team_deadline_idx')
+
+    def test_keyset_seeks_use_sort_indexes(self):
+        """Test that seeking past a cursor on each sortable column uses its (column, id) index"""
+        for field, value, index_name in [('deadline', timezone.now(), 'task_deadline_id_idx'),
+                                         ('name', 'Testing', 'task_name_id_idx'),
+                                         ('priority', 3, 'task_priority_id_idx')]:
+            seek = Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': 1})
+            self.assert_uses_index(Task.objects.filter(seek).order_by(field, 'pk')[:26], index_name)
+            self.assert_uses_index(Task.objects.order_by(f'-{field}', '-pk')[:26], index_name)
+
+    def test_description_search_uses_gin_index(self):
+        """Test that full-text search on descriptions uses the search vector index"""
+        tasks = search_tasks(Task.objects.all(), 'description', 'testing')
+        self.assert_uses_index(tasks, 'task_search_vector_idx')
+
+    def test_substring_filters_use_trigram_indexes(self):
+        """Test that name and username substring filters use the trigram indexes where pg_trgm is installed"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'task_name_trgm_idx'")
+            if cursor.fetchone() is None:
+                self.skipTest('pg_trgm is not available')
+        self.assert_uses_index(search_tasks(Task.objects.all(), 'name', 'estin'), 'task_name_trgm_idx')
+        self.assert_uses_index(User.objects.filter(username__icontains='john'), 'user_username_trgm_idx')
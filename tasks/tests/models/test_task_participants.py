@@ -0,0 +1,103 @@
+"""Unit tests for the task participant table"""
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from tasks.models import Task, TaskParticipant, Team, User
+from tasks.participants import diff_participants
+
+MEMBER, AUTHOR, BOTH = TaskParticipant.Role.MEMBER, TaskParticipant.Role.AUTHOR, TaskParticipant.Role.BOTH
+
+
+class TaskParticipantTestCase(TestCase):
+    """Unit tests for the task participant table"""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+    ]
+
+    def setUp(self):
+        self.author = User.objects.get(username='@johndoe')
+        self.member = User.objects.get(username='@janedoe')
+        self.other = User.objects.get(username='@petrapickles')
+        self.team = Team.objects.create(team_name='Test Team', team_admin=self.author)
+        self.task = Task.objects.create(name='Test Task', description='A task', deadline='2030-01-01T00:00:00Z',
+                                        priority=2, author=self.author, team=self.team)
+
+    def assert_participants(self, expected):
+        self.assertEqual(dict(TaskParticipant.objects.filter(task=self.task).values_list('user__username', 'role')),
+                         expected)
+
+    def test_author_takes_part(self):
+        """Test that a new task lists its author with the task's deadline and priority"""
+        participant = TaskParticipant.objects.get(task=self.task)
+        self.assertEqual(participant.user, self.author)
+        self.assertEqual(participant.role, AUTHOR)
+        self.assertEqual(participant.deadline, datetime(2030, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(participant.priority, 2)
+
+    def test_member_changes(self):
+        """Test that adding, removing and clearing members updates their rows, keeping the author's"""
+        self.task.members.add(self.member, self.author)
+        self.assert_participants({'@johndoe': BOTH, '@janedoe': MEMBER})
+        self.task.members.remove(self.author)
+        self.assert_participants({'@johndoe': AUTHOR, '@janedoe': MEMBER})
+        self.task.members.clear()
+        self.assert_participants({'@johndoe': AUTHOR})
+
+    def test_member_changes_from_user_side(self):
+        """Test that changing a user's tasks through the reverse relation updates their rows"""
+        self.member.assigned_members.add(self.task)
+        self.assert_participants({'@johndoe': AUTHOR, '@janedoe': MEMBER})
+        self.member.assigned_members.clear()
+        self.assert_participants({'@johndoe': AUTHOR})
+
+    def test_task_changes(self):
+        """Test that saving a task copies its new deadline and priority and moves the author role"""
+        self.task.members.add(self.member)
+        self.task.deadline = datetime(2031, 6, 1, tzinfo=dt_timezone.utc)
+        self.task.priority = 5
+        self.task.author = self.other
+        self.task.save()
+        self.assert_participants({'@petrapickles': AUTHOR, '@janedoe': MEMBER})
+        self.assertEqual(set(TaskParticipant.objects.values_list('deadline', 'priority')),
+                         {(datetime(2031, 6, 1, tzinfo=dt_timezone.utc), 5)})
+
+    def test_task_deletion(self):
+        """Test that deleting a task removes its rows"""
+        self.task.members.add(self.member)
+        self.task.delete()
+        self.assertFalse(TaskParticipant.objects.exists())
+
+    def test_rebuild_fixes_bulk_changes(self):
+        """Test that the rebuild command catches up with changes that bypassed the signals"""
+        self.task.members.add(self.member)
+        Task.objects.filter(pk=self.task.pk).update(priority=4)
+        TaskParticipant.objects.filter(user=self.member).delete()
+        TaskParticipant.objects.create(user=self.other, task=self.task, role=MEMBER, deadline=self.task.deadline,
+                                       priority=2)
+        out = StringIO()
+        call_command('rebuild_task_participants', stdout=out)
+        self.assertEqual(out.getvalue().strip(),
+                         'Rebuilt the participants of 1 tasks: 1 created, 1 updated, 1 deleted')
+        self.assert_participants({'@johndoe': AUTHOR, '@janedoe': MEMBER})
+        self.assertEqual(diff_participants([self.task.pk]), ([], [], []))
+
+    def test_check_reports_inconsistencies(self):
+        """Test that the check command lists inconsistent rows and fails, changing nothing"""
+        TaskParticipant.objects.filter(user=self.author).delete()
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 task participant rows are inconsistent'):
+            call_command('check_task_participants', stdout=out)
+        self.assertIn(f'Missing: user {self.author.pk} on task {self.task.pk}', out.getvalue())
+        self.assertFalse(TaskParticipant.objects.exists())
+
+    def test_check_passes_when_consistent(self):
+        """Test that the check command passes when the rows match the tasks"""
+        self.task.members.add(self.member)
+        out = StringIO()
+        call_command('check_task_participants', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Task participants are consistent')
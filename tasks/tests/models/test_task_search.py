@@ -0,0 +1,103 @@
+"""Unit tests of the task search engines."""
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from tasks.models import Task, Team, User
+from tasks.search import InMemorySearchEngine, PostgresSearchEngine, get_search_engine
+
+
+class TaskSearchTestCase(TestCase):
+    """Unit tests of the task search engines."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+        'tasks/tests/fixtures/default_team.json',
+        'tasks/tests/fixtures/default_task.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.other_user = User.objects.get(username='@janedoe')
+        self.team = Team.objects.get(team_name='Default Team')
+        self.testing = Task.objects.get(pk=1)
+        self.release = self._create_task('Release plan', 'Plan the next release of the models', self.other_user)
+        self.notes = self._create_task('Meeting notes', 'Write up notes from the release meeting', self.user)
+        self.parade = self._create_task('Walrus parade', 'Organise the zoo open day', self.user)
+
+    def _create_task(self, name, description, author):
+        return Task.objects.create(name=name, description=description, deadline='2023-11-20T10:00:00Z',
+                                   author=author, team=self.team)
+
+    def _search(self, engine, field, query):
+        return set(engine.search(Task.objects.all(), field, query).values_list('name', flat=True))
+
+    def test_memory_engine_matches_words_and_substrings(self):
+        """Test that the in-memory engine matches description words and name and username substrings"""
+        engine = InMemorySearchEngine()
+        self.assertEqual(self._search(engine, 'description', 'release'), {'Release plan', 'Meeting notes'})
+        self.assertEqual(self._search(engine, 'description', 'release meeting'), {'Meeting notes'})
+        self.assertEqual(self._search(engine, 'description', 'model'), {'Testing', 'Release plan'})
+        self.assertEqual(self._search(engine, 'name', 'ease pl'), {'Release plan'})
+        self.assertEqual(self._search(engine, 'author__username', 'JANE'), {'Release plan'})
+        self.assertEqual(self._search(engine, 'name', 'penguin'), set())
+
+    def test_description_search_ignores_names(self):
+        """Test that a description search only matches words in the description, for both engines"""
+        engines = [InMemorySearchEngine()]
+        if connection.vendor == 'postgresql':
+            engines.append(PostgresSearchEngine())
+        for engine in engines:
+            with self.subTest(engine=type(engine).__name__):
+                self.assertEqual(self._search(engine, 'description', 'walrus'), set())
+                self.assertEqual(self._search(engine, 'description', 'zoo'), {'Walrus parade'})
+                self.assertEqual(self._search(engine, 'name', 'walrus'), {'Walrus parade'})
+
+    def test_memory_engine_ranks_name_matches_first(self):
+        """Test that tasks with the query in their name rank above description matches"""
+        engine = InMemorySearchEngine()
+        tasks = engine.search(Task.objects.all(), 'description', 'release', ranked=True).order_by('-relevance')
+        self.assertEqual([task.name for task in tasks], ['Release plan', 'Meeting notes'])
+
+    def test_empty_query_matches_everything(self):
+        """Test that an empty query does not filter the tasks"""
+        self.assertEqual(len(self._search(InMemorySearchEngine(), 'name', '')), 4)
+
+    @override_settings(TASK_SEARCH_ENGINE='memory')
+    def test_memory_engine_follows_task_changes(self):
+        """Test that saving and deleting tasks updates the index without rebuilding it"""
+        engine = get_search_engine()
+        engine.rebuild()
+        self.release.name = 'Launch plan'
+        self.release.save()
+        self.assertEqual(self._search(engine, 'name', 'release'), set())
+        self.assertEqual(self._search(engine, 'name', 'launch'), {'Launch plan'})
+        penguin = self._create_task('Penguin', 'Feed the penguins', self.user)
+        self.assertEqual(self._search(engine, 'description', 'penguins'), {'Penguin'})
+        penguin_pk = penguin.pk
+        penguin.delete()
+        self.assertNotIn(penguin_pk, engine.match('description', 'penguins'))
+        self.other_user.username = '@janetdoe'
+        self.other_user.save()
+        self.assertEqual(self._search(engine, 'author__username', 'janet'), {'Launch plan'})
+
+    @skipUnless(connection.vendor == 'postgresql', 'The full-text engine needs PostgreSQL')
+    def test_vector_follows_writes_without_signals(self):
+        """Test that updates and bulk creates are searchable straight away, though they send no save signal"""
+        engine = PostgresSearchEngine()
+        Task.objects.filter(pk=self.release.pk).update(description='Feed the penguins')
+        Task.objects.bulk_create([Task(name='Zoo', description='Count the penguins', deadline='2023-11-20T10:00:00Z',
+                                       author=self.user, team=self.team)])
+        self.assertEqual(self._search(engine, 'description', 'penguin'), {'Release plan', 'Zoo'})
+        self.assertEqual(self._search(engine, 'description', 'models'), {'Testing'})
+
+    @skipUnless(connection.vendor == 'postgresql', 'The full-text engine needs PostgreSQL')
+    def test_engines_agree(self):
+        """Test that both engines answer the same queries with the same tasks"""
+        memory, postgres = InMemorySearchEngine(), PostgresSearchEngine()
+        for field, query in [('description', 'release'), ('description', 'release meeting'),
+                             ('description', 'model'), ('name', 'ease pl'), ('name', 'NOTES'),
+                             ('author__username', 'john'), ('name', 'penguin'), ('description', 'walrus zoo'), ('description', 'walrus')]:
+            self.assertEqual(self._search(memory, field, query), self._search(postgres, field, query), (field, query))
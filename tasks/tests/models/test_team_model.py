@@ -1,3 +1,6 @@
+from unittest import mock
+
+from django.db import IntegrityError
 from django.test import TestCase
 from tasks.models import User
 from tasks.models import Team
@@ -52,3 +55,40 @@ class TeamModelTestCase(TestCase):
     def test_admin_is_type_user(self):
         """Ensures that the team admin is a user"""
         self.assertTrue(isinstance(self.team.team_admin, User))
+
+    def test_slug_is_made_from_name(self):
+        """Tests that new teams get a slug from their name"""
+        self.assertEqual(self.team.slug, 'testteam')
+        self.assertIsInstance(self.team.pk, int)
+
+    def test_slugs_are_unique(self):
+        """Tests that teams whose names slugify alike get numbered slugs"""
+        team = Team.objects.create(team_name='Test Team', team_admin=self.user1)
+        other_team = Team.objects.create(team_name='test-team', team_admin=self.user1)
+        self.assertEqual(team.slug, 'test-team')
+        self.assertEqual(other_team.slug, 'test-team-2')
+        self.assertEqual(Team.objects.create(team_name='!!!').slug, 'team')
+
+    def test_slug_is_kept_on_rename(self):
+        """Tests that renaming a team keeps its slug, and so its URLs"""
+        self.team.team_name = 'RenamedTeam'
+        self.team.save()
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.slug, 'testteam')
+
+    def test_slug_taken_concurrently_is_retried(self):
+        """Tests that a team whose slug is taken between picking and saving it picks another"""
+        unique_slug = Team.unique_slug
+        # The first pick misses the team below, as if it were created at the same time
+        picks = iter(['concurrent'])
+        Team.objects.create(team_name='Concurrent', team_admin=self.user1)
+        with mock.patch.object(Team, 'unique_slug', side_effect=lambda name: next(picks, None) or unique_slug(name)):
+            team = Team.objects.create(team_name='concurrent!', team_admin=self.user1)
+        self.assertEqual(team.slug, 'concurrent-2')
+
+    def test_duplicate_name_is_not_retried(self):
+        """Tests that a clash on anything but the slug is raised straight away"""
+        with mock.patch.object(Team, 'unique_slug', wraps=Team.unique_slug) as unique_slug:
+            with self.assertRaises(IntegrityError):
+                Team.objects.create(team_name='TestTeam', team_admin=self.user1)
+        self.assertEqual(unique_slug.call_count, 1)
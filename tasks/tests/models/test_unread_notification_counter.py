@@ -0,0 +1,138 @@
+"""Unit tests for the unread notification counter kept on users"""
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from tasks.forms import UserForm
+from tasks.models import Notifications, Task, Team, User
+from tasks.notifications import drain_outbox, mark_read, notify, recount_unread, send_digests
+from tasks.tests.helpers import create_users
+
+
+class UnreadNotificationCounterTestCase(TestCase):
+    """Unit tests for the unread notification counter kept on users"""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+    ]
+
+    def setUp(self):
+        self.sender = User.objects.get(username='@johndoe')
+        self.recipients = create_users('member', 3)
+        self.team = Team.objects.create(team_name='Test Team', team_admin=self.sender)
+        self.task = Task.objects.create(name='Test Task', description='A task', deadline='2030-01-01T00:00:00Z',
+                                        author=self.sender, team=self.team)
+
+    def assertUnread(self, *expected):
+        counts = dict(User.objects.filter(pk__in=[user.pk for user in self.recipients])
+                      .values_list('pk', 'unread_notifications'))
+        self.assertEqual([counts[user.pk] for user in self.recipients], list(expected))
+
+    def test_notify_counts_new_notifications(self):
+        """Test that every new notification adds one to its recipient's counter"""
+        notify(self.recipients, self.sender, 'Hello')
+        notify(self.recipients[:1], self.sender, 'Hello again')
+        self.assertUnread(2, 1, 1)
+
+    def test_coalesced_events_are_not_counted_twice(self):
+        """Test that an event merged into an unread notification leaves the counter alone"""
+        for _ in range(3):
+            notify(self.recipients[:2], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        self.assertUnread(1, 1, 0)
+
+    def test_mark_read(self):
+        """Test that reading notifications takes them off the counter, once"""
+        notify(self.recipients, self.sender, 'Hello')
+        notify(self.recipients, self.sender, 'Hello again')
+        user = self.recipients[0]
+        self.assertEqual(mark_read(Notifications.objects.filter(message='Hello'), user), 1)
+        self.assertEqual(mark_read(Notifications.objects.filter(message='Hello'), user), 0)
+        self.assertUnread(1, 2, 2)
+        self.assertEqual(mark_read(Notifications.objects.all(), user), 1)
+        self.assertUnread(0, 2, 2)
+
+    @override_settings(NOTIFICATION_DELIVERY='outbox')
+    def test_outbox_counts_on_delivery(self):
+        """Test that queued notifications are counted when the worker delivers them"""
+        notify(self.recipients, self.sender, 'Hello')
+        notify(self.recipients[:1], self.sender, 'Hello again')
+        self.assertUnread(0, 0, 0)
+        drain_outbox()
+        self.assertUnread(2, 1, 1)
+
+    @override_settings(NOTIFICATION_DIGEST_KINDS=[Notifications.Kind.TASK_MODIFIED])
+    def test_digest_counts_once(self):
+        """Test that a digest counts as a single unread notification however many events it covers"""
+        for _ in range(3):
+            notify(self.recipients[:1], self.sender, 'Edit', task=self.task, kind=Notifications.Kind.TASK_MODIFIED)
+        send_digests()
+        self.assertUnread(1, 0, 0)
+
+    def test_task_deletion(self):
+        """Test that unread notifications deleted with their task come off the counter"""
+        notify(self.recipients, self.sender, 'Assigned', task=self.task, kind=Notifications.Kind.TASK_ASSIGNED)
+        notify(self.recipients[:1], self.sender, 'Hello')
+        mark_read(Notifications.objects.all(), self.recipients[1])
+        self.task.delete()
+        self.assertUnread(1, 0, 0)
+
+    def test_sender_deletion(self):
+        """Test that unread notifications deleted with their sender come off the counter"""
+        other_sender = User.objects.get(username='@janedoe')
+        notify(self.recipients, other_sender, 'Hello')
+        notify(self.recipients, self.sender, 'Hello')
+        other_sender.delete()
+        self.assertUnread(1, 1, 1)
+
+    def test_profile_update_keeps_counter(self):
+        """Test that saving a profile loaded before new notifications does not overwrite their count"""
+        user = User.objects.get(pk=self.recipients[0].pk)
+        notify(self.recipients[:1], self.sender, 'Hello')
+        form = UserForm(instance=user, data={'first_name': 'Changed', 'last_name': 'Member', 'username': '@member0',
+                                             'email': 'member0@example.org'})
+        self.assertTrue(form.is_valid())
+        form.save()
+        user.refresh_from_db()
+        self.assertEqual(user.first_name, 'Changed')
+        self.assertEqual(user.unread_notifications, 1)
+
+    def test_recount(self):
+        """Test that counters can be rebuilt from the notifications"""
+        notify(self.recipients, self.sender, 'Hello')
+        User.objects.update(unread_notifications=7)
+        recount_unread()
+        self.assertUnread(1, 1, 1)
+        self.assertEqual(User.objects.get(pk=self.sender.pk).unread_notifications, 0)
+
+    def test_recount_command(self):
+        """Test that the recount command rebuilds every counter and reports how many users it covered"""
+        notify(self.recipients, self.sender, 'Hello')
+        User.objects.update(unread_notifications=7)
+        out = StringIO()
+        call_command('recount_unread_notifications', stdout=out)
+        self.assertIn(f'Recounted the unread notifications of {User.objects.count()} users', out.getvalue())
+        self.assertUnread(1, 1, 1)
+
+
+class UnreadNotificationCounterTransactionTestCase(TransactionTestCase):
+    """Unit tests of the unread notification counter outside a test transaction"""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+    ]
+
+    def test_mark_read_and_counter_commit_together(self):
+        """Test that notifications stay unread if their recipient's counter cannot be updated"""
+        sender = User.objects.get(username='@johndoe')
+        recipient = User.objects.get(username='@janedoe')
+        notify([recipient], sender, 'Hello')
+        with mock.patch('tasks.notifications.adjust_unread', side_effect=DatabaseError('counter update failed')):
+            with self.assertRaises(DatabaseError):
+                mark_read(Notifications.objects.all(), recipient)
+        self.assertTrue(Notifications.objects.filter(read_at__isnull=True).exists())
+        self.assertEqual(User.objects.get(pk=recipient.pk).unread_notifications, 1)
@@ -0,0 +1,116 @@
+"""Tests of the calendar feed view."""
+from django.test import TestCase
+from django.urls import reverse
+
+from tasks.html_util.ical import calendar_feed_token, get_calendar_feed_user, revoke_calendar_feed_token
+from tasks.models import Task, Team, User
+
+
+class CalendarFeedViewTestCase(TestCase):
+    """Tests of the calendar feed view."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+        'tasks/tests/fixtures/default_team.json',
+        'tasks/tests/fixtures/default_task.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.team = Team.objects.get(team_name='Default Team')
+        self.task = Task.objects.get(pk=1)
+        self.url = reverse('calendar_feed', kwargs={'token': calendar_feed_token(self.user)})
+
+    def _content(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_feed_streams_assigned_tasks(self):
+        """Test that the feed contains an event for each task the user is assigned to"""
+        other_user = User.objects.get(username='@janedoe')
+        not_assigned = Task.objects.create(name='Not assigned', description='Someone else', deadline='2023-11-20T10:00:00Z',
+                                           author=self.user, team=self.team)
+        not_assigned.members.set([other_user])
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        content = self._content(response)
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(content.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:task-{self.task.pk}@testserver\r\n', content)
+        self.assertIn('DTSTART:20231116T154322Z\r\n', content)
+        self.assertIn('SUMMARY:Testing\r\n', content)
+        self.assertIn('PRIORITY:5\r\n', content)
+
+    def test_feed_escapes_and_folds_text(self):
+        """Test that text values are escaped and long lines folded"""
+        self.task.description = 'Commas, semicolons; and\na new line' + 'x' * 100
+        self.task.save()
+        content = self._content(self.client.get(self.url))
+        self.assertIn('DESCRIPTION:Commas\\, semicolons\\; and\\na new line', content)
+        for line in content.split('\r\n'):
+            self.assertLessEqual(len(line.encode('utf-8')), 75)
+
+    def test_feed_rejects_bad_token(self):
+        """Test that a tampered or unknown token is rejected"""
+        for token in [calendar_feed_token(self.user) + 'x', '2:' + calendar_feed_token(self.user).partition(':')[2],
+                      'bad', '999:abc', '²:abc']:
+            response = self.client.get(reverse('calendar_feed', kwargs={'token': token}))
+            self.assertEqual(response.status_code, 404)
+
+    def test_inactive_user_token_is_rejected(self):
+        """Test that the token of a deactivated user no longer works"""
+        token = calendar_feed_token(self.user)
+        self.assertEqual(get_calendar_feed_user(token), self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(get_calendar_feed_user(token))
+
+    def test_revoked_token_is_rejected(self):
+        """Test that a revoked token stops working and the new one works"""
+        old_token = calendar_feed_token(self.user)
+        new_token = revoke_calendar_feed_token(self.user)
+        self.assertNotEqual(new_token, old_token)
+        self.assertIsNone(get_calendar_feed_user(old_token))
+        self.assertEqual(get_calendar_feed_user(new_token), self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_tokens_differ_between_users(self):
+        """Test that each user's token is signed with their own secret"""
+        other_user = User.objects.get(username='@janedoe')
+        self.assertNotEqual(self.user.calendar_feed_secret, other_user.calendar_feed_secret)
+        forged = f'{other_user.pk}:' + calendar_feed_token(self.user).partition(':')[2]
+        self.assertIsNone(get_calendar_feed_user(forged))
+
+    def test_revoke_view(self):
+        """Test that users can replace their feed URL from the timeline"""
+        self.client.login(username=self.user.username, password='Password123')
+        self.assertEqual(self.client.get(reverse('revoke_calendar_feed')).status_code, 405)
+        response = self.client.post(reverse('revoke_calendar_feed'), follow=True)
+        self.assertRedirects(response, reverse('timeline'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.user.refresh_from_db()
+        self.assertContains(response, reverse('calendar_feed', kwargs={'token': calendar_feed_token(self.user)}))
+
+    def test_revoke_view_requires_login(self):
+        """Test that anonymous users are sent to log in rather than revoking anything"""
+        response = self.client.post(reverse('revoke_calendar_feed'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_feed_is_not_modified_for_matching_etag(self):
+        """Test that polling clients with the returned validators get a 304"""
+        response = self.client.get(self.url)
+        repeat = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.task.members.clear()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_timeline_shows_feed_url(self):
+        """Test that the timeline page shows the user's subscription url"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('timeline'))
+        self.assertContains(response, self.url)
@@ -1,17 +1,39 @@
 """Tests of the dashboard view."""
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
-from tasks.models import User
+from django.utils import timezone
+from tasks.models import Task, Team, User
 from tasks.forms import TimezoneForm
 
 class DashboardViewTestCase(TestCase):
     """Tests of the dashboard view."""
 
-    fixtures = ['tasks/tests/fixtures/default_user.json']
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+        'tasks/tests/fixtures/default_team.json',
+    ]
 
     def setUp(self):
         self.url = reverse('dashboard')
         self.user = User.objects.get(username='@johndoe')
+        self.team = Team.objects.get(team_name='Default Team')
+        cache.clear()
+
+    def _create_task(self, name, deadline, members=None):
+        task = Task.objects.create(name=name, description='A task', deadline=deadline, author=self.user,
+                                   team=self.team)
+        task.members.add(*(members or [self.user]))
+        return task
+
+    def _task_names(self):
+        response = self.client.get(self.url)
+        return ([task.name for task in response.context['upcoming_tasks']],
+                [task.name for task in response.context['overdue_tasks']])
 
     def test_dashboard_url(self):
         """Test that url is correct"""
@@ -45,3 +67,68 @@ class DashboardViewTestCase(TestCase):
         redirect_url = '/log_in/?next=/dashboard/'
         self.assertRedirects(response, redirect_url, status_code=302, target_status_code=200)
         self.assertTemplateUsed(response, 'log_in.html')
+
+    def test_dashboard_lists_tasks(self):
+        """Test that the user's tasks are split into upcoming and overdue ones, soonest first"""
+        now = timezone.now()
+        self._create_task('Later', now + timedelta(days=2))
+        self._create_task('Sooner', now + timedelta(days=1))
+        self._create_task('Late', now - timedelta(days=1))
+        self._create_task('Not mine', now + timedelta(days=1), members=[User.objects.get(username='@janedoe')])
+        self.client.login(username=self.user.username, password="Password123")
+        self.assertEqual(self._task_names(), (['Sooner', 'Later'], ['Late']))
+
+    def test_dashboard_tasks_are_cached(self):
+        """Test that repeat visits do not query the tasks again"""
+        self._create_task('Upcoming', timezone.now() + timedelta(days=1))
+        self.client.login(username=self.user.username, password="Password123")
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual([task.name for task in response.context['upcoming_tasks']], ['Upcoming'])
+
+    def test_adding_member_invalidates_dashboard(self):
+        """Test that a task shows up as soon as the user is made a member"""
+        task = self._create_task('Shared', timezone.now() + timedelta(days=1),
+                                 members=[User.objects.get(username='@janedoe')])
+        self.client.login(username=self.user.username, password="Password123")
+        self.assertEqual(self._task_names(), ([], []))
+        task.members.add(self.user)
+        self.assertEqual(self._task_names(), (['Shared'], []))
+        self.user.assigned_members.remove(task)
+        self.assertEqual(self._task_names(), ([], []))
+
+    def test_clearing_members_invalidates_dashboard(self):
+        """Test that a task goes away when its members are cleared"""
+        task = self._create_task('Cleared', timezone.now() + timedelta(days=1))
+        self.client.login(username=self.user.username, password="Password123")
+        self.assertEqual(self._task_names(), (['Cleared'], []))
+        task.members.clear()
+        self.assertEqual(self._task_names(), ([], []))
+
+    def test_saving_task_invalidates_dashboard(self):
+        """Test that changes to a task are shown straight away"""
+        task = self._create_task('Before', timezone.now() + timedelta(days=1))
+        self.client.login(username=self.user.username, password="Password123")
+        self.assertEqual(self._task_names(), (['Before'], []))
+        task.name = 'After'
+        task.deadline = timezone.now() - timedelta(days=1)
+        task.save()
+        self.assertEqual(self._task_names(), ([], ['After']))
+
+    def test_deleting_task_invalidates_dashboard(self):
+        """Test that deleted tasks leave the dashboard straight away"""
+        task = self._create_task('Deleted', timezone.now() + timedelta(days=1))
+        self.client.login(username=self.user.username, password="Password123")
+        self.assertEqual(self._task_names(), (['Deleted'], []))
+        task.delete()
+        self.assertEqual(self._task_names(), ([], []))
+
+    def test_cache_expires_at_next_deadline(self):
+        """Test that a task moves to the overdue list once its deadline passes, without any change to it"""
+        now = timezone.now()
+        self._create_task('Due soon', now + timedelta(minutes=5))
+        self.client.login(username=self.user.username, password="Password123")
+        self.assertEqual(self._task_names(), (['Due soon'], []))
+        with mock.patch('tasks.dashboard.timezone.now', return_value=now + timedelta(minutes=6)):
+            self.assertEqual(self._task_names(), ([], ['Due soon']))
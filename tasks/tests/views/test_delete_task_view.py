@@ -1,7 +1,11 @@
-from django.test import TestCase
+from unittest import mock
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from tasks.models import Task, Team
+from tasks.models import NotificationOutbox, Notifications, Task, Team
+from tasks.tests.helpers import create_users
 
 class TaskTests(TestCase):
     def setUp(self):
@@ -50,4 +54,49 @@ class TaskTests(TestCase):
         self.assertEqual(response.status_code, 302)
 
         # Check that the task was deleted
-        self.assertFalse(Task.objects.filter(pk=self.task.id).exists())
\ No newline at end of file
+        self.assertFalse(Task.objects.filter(pk=self.task.id).exists())
+
+    def test_delete_task_notifies_members_in_one_insert(self):
+        """Test that every member is notified of the deletion with a single INSERT"""
+        members = create_users('member', 40)
+        self.task.members.set(members)
+        self.client.login(username='testuser', password='testpassword')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('delete_task', kwargs={'pk': self.task.id}))
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "tasks_notifications"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Notifications.objects.filter(message='Task "Test Task" has been deleted.').count(), 40)
+
+    @override_settings(NOTIFICATION_DELIVERY='outbox')
+    def test_delete_task_queues_notification(self):
+        """Test that with outbox delivery the deletion only queues one event for the members"""
+        members = create_users('member', 40)
+        self.task.members.set(members)
+        self.client.login(username='testuser', password='testpassword')
+
+        self.client.post(reverse('delete_task', kwargs={'pk': self.task.id}))
+
+        self.assertFalse(Notifications.objects.exists())
+        event = NotificationOutbox.objects.get()
+        self.assertEqual(sorted(event.recipient_ids), sorted(member.pk for member in members))
+
+
+class DeleteTaskTransactionTests(TransactionTestCase):
+    def test_failed_delete_discards_notifications(self):
+        """Test that the members are not told of a deletion that was rolled back"""
+        User = get_user_model()
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        team = Team.objects.create(team_name='Test Team', team_admin=user)
+        task = Task.objects.create(name='Test Task', description='This is a test task', deadline='2030-12-31',
+                                   author=user, team=team)
+        task.members.set([user])
+        self.client.login(username='testuser', password='testpassword')
+
+        with mock.patch.object(Task, 'delete', side_effect=DatabaseError('delete failed')):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('delete_task', kwargs={'pk': task.id}))
+
+        self.assertTrue(Task.objects.filter(pk=task.id).exists())
+        self.assertFalse(Notifications.objects.exists())
@@ -1,7 +1,12 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from tasks.models import Notifications
+from tasks.notifications import notify
+from tasks.tests.helpers import create_users
 
 class InboxPageViewTest(TestCase):
     def setUp(self):
@@ -33,3 +38,95 @@ class InboxPageViewTest(TestCase):
         # Check that the rendered HTML contains the notification messages
         for notification in Notifications.objects.filter(recipient=self.user):
             self.assertContains(response, notification.message)
+
+    def test_read_all_marks_notifications_read(self):
+        """Test that reading all keeps the notifications, marking them read with a single UPDATE"""
+        # The session, the user, the UPDATE and the unread counter
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('inbox'), {'action': 'read_all'})
+        self.assertRedirects(response, reverse('inbox'))
+        self.assertEqual(Notifications.objects.filter(recipient=self.user).count(), 2)
+        self.assertFalse(Notifications.objects.filter(recipient=self.user, read_at__isnull=True).exists())
+
+    def test_read_one_notification(self):
+        """Test that a single notification can be marked as read"""
+        notification = Notifications.objects.get(message='Test Notification 1')
+        self.client.post(reverse('inbox'), {'action': 'read', 'notification': notification.pk})
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.read_at)
+        self.assertIsNone(Notifications.objects.get(message='Test Notification 2').read_at)
+
+    def test_read_with_malformed_id(self):
+        """Test that a notification id that is not a number is ignored"""
+        for notification in ['', 'abc', '²']:
+            response = self.client.post(reverse('inbox'), {'action': 'read', 'notification': notification})
+            self.assertRedirects(response, reverse('inbox'))
+        self.assertFalse(Notifications.objects.filter(read_at__isnull=False).exists())
+
+    def test_read_other_users_notification(self):
+        """Test that users cannot mark someone else's notification as read"""
+        User = get_user_model()
+        other = User.objects.create_user(username='otheruser', email='other@example.org', password='testpassword')
+        notification = Notifications.objects.create(recipient=other, sender=self.user, message='Not yours')
+        self.client.post(reverse('inbox'), {'action': 'read', 'notification': notification.pk})
+        notification.refresh_from_db()
+        self.assertIsNone(notification.read_at)
+
+    def test_unread_filter(self):
+        """Test that the inbox can be limited to unread notifications"""
+        Notifications.objects.filter(message='Test Notification 1').update(read_at=timezone.now())
+        response = self.client.get(reverse('inbox') + '?unread=1')
+        self.assertNotContains(response, 'Test Notification 1')
+        self.assertContains(response, 'Test Notification 2')
+
+    def test_inbox_is_cursor_paginated(self):
+        """Test that long inboxes are split into pages linked by cursors, newest first"""
+        Notifications.objects.bulk_create([
+            Notifications(recipient=self.user, sender=self.user, message=f'Bulk {i}',
+                          timestamp=timezone.now() + timedelta(minutes=i))
+            for i in range(30)
+        ])
+        response = self.client.get(reverse('inbox'))
+        notifications = list(response.context['notifications'])
+        self.assertEqual(len(notifications), 25)
+        self.assertEqual(notifications[0].message, 'Bulk 29')
+        page = response.context['page_obj']
+        self.assertFalse(page.has_previous())
+
+        response = self.client.get(reverse('inbox'), {'cursor': page.next_cursor})
+        messages = [notification.message for notification in response.context['notifications']]
+        self.assertEqual(len(messages), 7)
+        self.assertEqual(messages[-2:], ['Test Notification 2', 'Test Notification 1'])
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_inbox_query_count_independent_of_senders(self):
+        """Test that senders and tasks are fetched with the notifications rather than one by one"""
+        senders = create_users('sender', 10)
+        Notifications.objects.bulk_create([Notifications(recipient=self.user, sender=sender, message='Hi')
+                                           for sender in senders])
+        with self.assertNumQueries(3):
+            self.client.get(reverse('inbox'))
+
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor is not found"""
+        response = self.client.get(reverse('inbox'), {'cursor': 'bad'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_inbox_redirects_when_not_logged_in(self):
+        """Test that the inbox needs a logged in user"""
+        self.client.logout()
+        response = self.client.get(reverse('inbox'))
+        self.assertRedirects(response, '/log_in/?next=/Inbox', status_code=302, target_status_code=200)
+
+    def test_navbar_shows_unread_count(self):
+        """Test that the navbar badge shows the unread count, without counting notifications per request"""
+        notify([self.user], self.user, 'Counted')
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('inbox') + '?unread=1')
+        self.assertEqual(response.context['unread_notification_count'], 1)
+        self.assertContains(response, '<span class="badge rounded-pill bg-danger">1</span>', html=True)
+
+        self.client.post(reverse('inbox'), {'action': 'read_all'})
+        response = self.client.get(reverse('inbox'))
+        self.assertEqual(response.context['unread_notification_count'], 0)
+        self.assertNotContains(response, 'rounded-pill')
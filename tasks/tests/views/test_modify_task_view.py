@@ -1,9 +1,13 @@
 "Test of the Modify Task View"
 from datetime import timedelta
-from django.test import TestCase
+from unittest import mock
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
-from tasks.models import User, Task, Team
+from tasks.models import Notifications, User, Task, Team
+from tasks.tests.helpers import create_users
 
 
 
@@ -76,4 +80,84 @@ class ModifyTaskTestCase(TestCase):
 
 
 
-        
\ No newline at end of file
+        
+
+    def test_repeated_modifications_coalesce(self):
+        """Test that members get one notification for repeated edits of a task, counting the edits"""
+        self.client.login(username='testuser', password='testpassword')
+        url = reverse('modify_task', kwargs={'pk': self.task.id})
+        deadline = (timezone.now() + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M')
+        for name in ('First edit', 'Second edit'):
+            self.client.post(url, data={'name': name, 'description': 'Edited', 'deadline': deadline, 'priority': 3})
+
+        notification = Notifications.objects.get(recipient=self.another_user,
+                                                 kind=Notifications.Kind.TASK_MODIFIED)
+        self.assertEqual(notification.count, 2)
+        self.assertEqual(notification.message, 'Task: Second edit has been modified.')
+        self.assertEqual(notification.task, self.task)
+
+    def _modify_members(self, add_members=(), remove_members=()):
+        deadline = (timezone.now() + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M')
+        return self.client.post(reverse('modify_task', kwargs={'pk': self.task.id}), data={
+            'name': 'Test Task', 'description': 'Edited', 'deadline': deadline, 'priority': 3,
+            'add_members': [member.pk for member in add_members],
+            'remove_members': [member.pk for member in remove_members],
+        })
+
+    def test_member_changes_are_applied_and_notified(self):
+        """Test that added and removed members are updated and each told once"""
+        self.client.login(username='testuser', password='testpassword')
+        response = self._modify_members(add_members=[self.user], remove_members=[self.another_user])
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(self.task.members.all()), [self.user])
+        self.assertEqual(Notifications.objects.get(kind=Notifications.Kind.TASK_ASSIGNED).recipient, self.user)
+        self.assertEqual(Notifications.objects.get(kind=Notifications.Kind.TASK_UNASSIGNED).recipient,
+                         self.another_user)
+
+    def test_member_changes_take_constant_queries(self):
+        """Test that adding or removing many members takes as many queries as one"""
+        users = create_users('member', 20)
+        self.team.team_members.add(*users)
+        self.client.login(username='testuser', password='testpassword')
+        # Give the current member a modification notice to merge into, as every later edit does
+        self._modify_members()
+        with CaptureQueriesContext(connection) as one:
+            self._modify_members(add_members=users[:1])
+        with CaptureQueriesContext(connection) as many:
+            self._modify_members(add_members=users[1:])
+        self.assertEqual(len(many), len(one))
+        self.assertEqual(self.task.members.count(), 21)
+        with CaptureQueriesContext(connection) as remove_one:
+            self._modify_members(remove_members=users[:1])
+        with CaptureQueriesContext(connection) as remove_many:
+            self._modify_members(remove_members=users[1:])
+        self.assertEqual(len(remove_many), len(remove_one))
+        self.assertEqual(list(self.task.members.all()), [self.another_user])
+
+
+class ModifyTaskTransactionTestCase(TransactionTestCase):
+    """Tests of the modify task view outside a test transaction"""
+
+    def test_failed_save_discards_member_changes_and_notifications(self):
+        """Test that the member changes and their notifications are rolled back when the task cannot be saved"""
+        user = User.objects.create_user(username='testuser', password='testpassword', email='user@gmail.com')
+        member = User.objects.create_user(username='anotheruser', password='testpassword', email='user2@gmail.com')
+        team = Team.objects.create(team_name='Test Team', team_admin=user)
+        team.team_members.add(user, member)
+        task = Task.objects.create(name='Test Task', description='This is a test task',
+                                   deadline=timezone.now() + timedelta(days=7), author=user, team=team)
+        task.members.set([member])
+        self.client.login(username='testuser', password='testpassword')
+        deadline = (timezone.now() + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M')
+
+        # The form saves the task first; fail the view's own save, made after the members are told
+        with mock.patch.object(Task, 'save', side_effect=[None, DatabaseError('save failed')]):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('modify_task', kwargs={'pk': task.id}), data={
+                    'name': 'Test Task', 'description': 'Edited', 'deadline': deadline, 'priority': 3,
+                    'add_members': [user.pk], 'remove_members': [member.pk],
+                })
+
+        self.assertEqual(list(task.members.all()), [member])
+        self.assertFalse(Notifications.objects.exists())
+        self.assertEqual(User.objects.get(pk=user.pk).unread_notifications, 0)
@@ -0,0 +1,185 @@
+"""Tests of the live notification stream."""
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from tasks.models import Notifications, Task, User
+from tasks.notification_stream import (NotificationBroker, broker, START, decode_position,
+                                      encode_position, stream_notifications)
+from tasks.notifications import notify
+
+
+async def _next_event(stream):
+    async for chunk in stream:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if not chunk.startswith(':'):
+            return chunk
+
+
+async def read_event(response, timeout=5):
+    """Returns the next chunk of the stream that is not a keep-alive comment"""
+    return await asyncio.wait_for(_next_event(response.streaming_content), timeout)
+
+
+@override_settings(NOTIFICATION_STREAM_POLL_INTERVAL=0.05)
+class NotificationStreamViewTestCase(TestCase):
+    """Tests of the live notification stream."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+        'tasks/tests/fixtures/default_team.json',
+        'tasks/tests/fixtures/default_task.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.sender = User.objects.get(username='@janedoe')
+        self.url = reverse('notification_stream')
+
+    async def test_requires_login(self):
+        """Test that anonymous users cannot open a stream"""
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_headers(self):
+        """Test that the stream is served as uncached server-sent events"""
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertTrue(response.is_async)
+        self.assertEqual(await read_event(response), 'retry: 50\nid: 0-0\n\n')
+
+    async def test_streams_new_notifications(self):
+        """Test that notifications created after the stream opens are pushed, but older ones are not"""
+        await sync_to_async(notify)([self.user], self.sender, 'Before')
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(self.url)
+        await read_event(response)
+
+        await sync_to_async(notify)([self.user], self.sender, 'After')
+        event = await read_event(response)
+        self.assertIn('event: notification', event)
+        data = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual(data['message'], 'After')
+        self.assertEqual(data['sender'], '@janedoe')
+        self.assertEqual(data['unread'], 2)
+
+    async def test_resumes_after_last_event_id(self):
+        """Test that a reconnecting client gets everything after the last event it saw, in order"""
+        await sync_to_async(notify)([self.user], self.sender, 'First')
+        first = await Notifications.objects.aget(message='First')
+        await sync_to_async(notify)([self.user], self.sender, 'Second')
+        await sync_to_async(notify)([self.user], self.sender, 'Third')
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(self.url, headers={'Last-Event-ID': encode_position(first.timestamp, first.pk)})
+        await read_event(response)
+        self.assertIn('"Second"', await read_event(response))
+        self.assertIn('"Third"', await read_event(response))
+
+    async def test_starts_from_latest_notification(self):
+        """Test that a new stream gives the position of the user's latest notification, for the browser to resume from"""
+        await sync_to_async(notify)([self.user], self.sender, 'Before')
+        latest = await Notifications.objects.aget(message='Before')
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(await read_event(response), f'retry: 50\nid: {encode_position(latest.timestamp, latest.pk)}\n\n')
+
+    def test_polls_under_wsgi(self):
+        """Test that under WSGI the stream only sends what is new and ends, rather than holding a worker"""
+        notify([self.user], self.sender, 'First')
+        first = Notifications.objects.get(message='First')
+        notify([self.user], self.sender, 'Second')
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, headers={'Last-Event-ID': encode_position(first.timestamp, first.pk)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertFalse(response.is_async)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(chunks[0], f'retry: 50\nid: {encode_position(first.timestamp, first.pk)}\n\n')
+        self.assertEqual(len(chunks), 2)
+        self.assertIn('"Second"', chunks[1])
+
+    async def test_streams_coalesced_notifications(self):
+        """Test that a repeat merged into an open stream's notification is sent again with its new count"""
+        task = await Task.objects.aget(pk=1)
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(self.url)
+        await read_event(response)
+        for message in ('First edit', 'Second edit'):
+            await sync_to_async(notify)([self.user], self.sender, message, task=task,
+                                        kind=Notifications.Kind.TASK_MODIFIED)
+        events = [await read_event(response)]
+        if '"count": 1' in events[0]:
+            events.append(await read_event(response))
+        data = json.loads(events[-1].split('data: ', 1)[1])
+        self.assertEqual(data['message'], 'Second edit')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['unread'], 1)
+
+    def test_coalescing_wakes_streams(self):
+        """Test that merging a repeat into a notification wakes up the recipient's streams once committed"""
+        task = Task.objects.get(pk=1)
+        notify([self.user], self.sender, 'First edit', task=task, kind=Notifications.Kind.TASK_MODIFIED)
+        with mock.patch.object(broker, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            notify([self.user], self.sender, 'Second edit', task=task, kind=Notifications.Kind.TASK_MODIFIED)
+        publish.assert_called_once_with({self.user.pk})
+
+    def test_decode_position(self):
+        """Test that event ids round-trip, and that anything else is not taken for a position"""
+        notify([self.user], self.sender, 'Hello')
+        notification = Notifications.objects.get()
+        position = (notification.timestamp, notification.pk)
+        self.assertEqual(decode_position(encode_position(*position)), position)
+        for event_id in ['', '12', 'abc-1', '1-x', '²-1', '1-²', '9' * 30 + '-1']:
+            self.assertIsNone(decode_position(event_id))
+
+    async def test_only_streams_own_notifications(self):
+        """Test that users are not sent anyone else's notifications"""
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(self.url)
+        await read_event(response)
+        await sync_to_async(notify)([self.sender], self.user, 'Not yours')
+        await sync_to_async(notify)([self.user], self.sender, 'Yours')
+        self.assertIn('"Yours"', await read_event(response))
+
+    async def test_subscribes_while_open(self):
+        """Test that an open stream is registered with the broker and removed when it closes"""
+        stream = stream_notifications(self.user.pk, START)
+        await anext(stream)
+        self.assertIn(self.user.pk, broker.subscribers)
+        await stream.aclose()
+        self.assertNotIn(self.user.pk, broker.subscribers)
+
+    @override_settings(NOTIFICATION_STREAM_MAX_AGE=0.1)
+    async def test_stream_ends_after_max_age(self):
+        """Test that streams end after a while, leaving the client to reconnect"""
+        chunks = [chunk async for chunk in stream_notifications(self.user.pk, START)]
+        self.assertEqual(chunks[0], 'retry: 50\nid: 0-0\n\n')
+        self.assertNotIn(self.user.pk, broker.subscribers)
+
+
+class NotificationBrokerTestCase(TestCase):
+    """Tests of the in-process notification broker."""
+
+    async def test_publish_wakes_subscribers(self):
+        """Test that publishing from another thread wakes up only the given users' streams"""
+        test_broker = NotificationBroker()
+        _, event = test_broker.subscribe(1)
+        _, other_event = test_broker.subscribe(2)
+        await sync_to_async(test_broker.publish, thread_sensitive=False)([1])
+        await asyncio.wait_for(event.wait(), 1)
+        self.assertFalse(other_event.is_set())
+
+    async def test_unsubscribe(self):
+        """Test that closed streams are forgotten"""
+        test_broker = NotificationBroker()
+        subscription = test_broker.subscribe(1)
+        test_broker.unsubscribe(1, subscription)
+        self.assertEqual(test_broker.subscribers, {})
+        test_broker.publish([1])
@@ -0,0 +1,87 @@
+"""Tests of the query instrumentation middleware."""
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from tasks.middleware import QueryBudgetExceeded, normalize_sql
+from tasks.models import Task, Team, User
+from tasks.views import TimelineYearView
+
+
+@override_settings(QUERY_INSTRUMENTATION=True, QUERY_BUDGET_STRICT=True)
+class QueryInstrumentationTestCase(TestCase):
+    """Tests of the query instrumentation middleware."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/default_team.json',
+        'tasks/tests/fixtures/default_task.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.team = Team.objects.get(team_name='Default Team')
+        self.client.login(username=self.user.username, password='Password123')
+
+    def _create_tasks(self, count):
+        for i in range(count):
+            task = Task.objects.create(name=f'Task {i}', description='Extra task', deadline='2023-06-10T12:00:00Z',
+                                       author=self.user, team=self.team)
+            task.members.add(self.user)
+
+    def test_server_timing_header(self):
+        """Test that responses report the number of queries and the time spent in the database"""
+        response = self.client.get(reverse('timeline_year', kwargs={'year': 2023}))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=\d+\.\d;desc="3 queries"$')
+
+    def test_logs_request_queries(self):
+        """Test that each request logs a line with its query count and budget"""
+        with self.assertLogs('tasks.queries', level='INFO') as logs:
+            self.client.get(reverse('timeline_year', kwargs={'year': 2023}))
+        self.assertIn('"view": "TimelineYearView"', logs.output[0])
+        self.assertIn('"queries": 3', logs.output[0])
+        self.assertIn('"budget": 4', logs.output[0])
+
+    @override_settings(QUERY_INSTRUMENTATION=False)
+    def test_disabled_by_setting(self):
+        """Test that nothing is reported when instrumentation is turned off"""
+        response = self.client.get(reverse('timeline_year', kwargs={'year': 2023}))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_budget_exceeded_raises_when_strict(self):
+        """Test that going over a view's budget raises, naming the repeated queries"""
+        with mock.patch.object(TimelineYearView, 'query_budget', 1):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'TimelineYearView ran 3 queries'):
+                self.client.get(reverse('timeline_year', kwargs={'year': 2023}))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_warns(self):
+        """Test that going over a view's budget only logs a warning unless strict"""
+        with mock.patch.object(TimelineYearView, 'query_budget', 1):
+            with self.assertLogs('tasks.queries', level='WARNING'):
+                response = self.client.get(reverse('timeline_year', kwargs={'year': 2023}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_views_stay_within_budget(self):
+        """Test that the instrumented views stay within their budgets however many tasks there are"""
+        self._create_tasks(15)
+        urls = [
+            reverse('dashboard'),
+            reverse('task_list'),
+            reverse('task_detail', args=[1]),
+            reverse('modify_task', args=[1]),
+            reverse('timeline'),
+            reverse('timeline_year', kwargs={'year': 2023}),
+            reverse('timeline_month', kwargs={'year': 2023, 'month': 11}),
+            reverse('inbox'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_normalize_sql(self):
+        """Test that queries differing only in literals and parameter counts share a shape"""
+        self.assertEqual(normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+                         'SELECT * FROM t WHERE id IN (%s, ...) AND name = ? LIMIT ?')
+        self.assertEqual(normalize_sql('SELECT * FROM t WHERE id IN (%s)'), 'SELECT * FROM t WHERE id IN (%s)')
@@ -1,10 +1,11 @@
 """Tests of the task list view."""
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from tasks.models import Task, User, Team
 from tasks.forms import TaskSortForm
+from tasks.search import get_search_engine
 from datetime import datetime
 
 
@@ -108,3 +109,162 @@ class TaskListTestCase(TestCase):
         self.assertEqual(num_tasks,2)
 
 
+    def _create_tasks(self, count):
+        for i in range(count):
+            task = Task.objects.create(name=f'Task {i}', description='Extra task', deadline="2023-11-16T15:43:22.039Z",
+                                       priority=2, author=self.user, team=self.team, id=100 + i)
+            task.members.set([self.user])
+
+    def test_task_listed_once_when_author_and_member(self):
+        """Test that a task the user both authored and is assigned to is only listed once"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('task_list'))
+        task_ids = [task.id for task in response.context['task_list']]
+        self.assertEqual(sorted(task_ids), [1, 10])
+
+    def test_task_list_is_paginated(self):
+        """Test that the list is split into pages, carrying the sort criteria across pages"""
+        self._create_tasks(30)
+        self.client.login(username=self.user.username, password='Password123')
+        sort_conditions = "?sort_by=name&asc_or_desc=None&filter_by=name&filter_string="
+        response = self.client.get(reverse('task_list') + sort_conditions)
+        self.assertEqual(len(response.context['task_list']), 25)
+        self.assertEqual(response.context['page_obj'].paginator.count, 32)
+        self.assertContains(response, '32 Tasks Total')
+        self.assertContains(response, 'sort_by=name&amp;asc_or_desc=None&amp;filter_by=name&amp;filter_string=&page=2')
+        response = self.client.get(reverse('task_list') + sort_conditions + '&page=2')
+        self.assertEqual(len(response.context['task_list']), 7)
+
+    def test_task_list_query_count_independent_of_tasks(self):
+        """Test that the number of queries does not grow with the number of tasks"""
+        self.client.login(username=self.user.username, password='Password123')
+        url = reverse('task_list')
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        self._create_tasks(30)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def _walk_cursor_pages(self, sort_conditions):
+        """Follows the next links from the first cursor page, returning the task ids in the order seen"""
+        url = reverse('task_list') + sort_conditions + '&cursor='
+        task_ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page_obj']
+            task_ids += [task.id for task in response.context['task_list']]
+            url = None
+            if page.has_next():
+                url = reverse('task_list') + sort_conditions + '&cursor=' + page.next_cursor
+        return task_ids
+
+    def test_cursor_pagination_matches_full_ordering(self):
+        """Test that following cursors visits every task once, in order, for each sort option"""
+        self._create_tasks(30)
+        # Saved one by one so their participant rows, which the deadline and priority sorts read, follow
+        for task in Task.objects.filter(id__in=[100, 101, 102]):
+            task.name, task.priority = 'Same name', 5
+            task.save()
+        self.client.login(username=self.user.username, password='Password123')
+        for sort_by in ['deadline', 'name', 'priority', 'author__username']:
+            for asc_or_desc, prefix in [('None', ''), ('on', '-')]:
+                sort_conditions = f"?sort_by={sort_by}&asc_or_desc={asc_or_desc}&filter_by=name&filter_string="
+                expected = list(Task.objects.order_by(prefix + sort_by, prefix + 'id').values_list('id', flat=True))
+                self.assertEqual(self._walk_cursor_pages(sort_conditions), expected)
+
+    def test_cursor_pagination_by_relevance(self):
+        """Test that following cursors through equally relevant matches visits every task once"""
+        self._create_tasks(30)
+        self.client.login(username=self.user.username, password='Password123')
+        sort_conditions = "?sort_by=relevance&asc_or_desc=None&filter_by=description&filter_string=extra"
+        self.assertEqual(self._walk_cursor_pages(sort_conditions), list(range(129, 99, -1)))
+
+    def test_cursor_pagination_previous_page(self):
+        """Test that the previous cursor returns to the page before"""
+        self._create_tasks(60)
+        self.client.login(username=self.user.username, password='Password123')
+        sort_conditions = "?sort_by=name&asc_or_desc=None&filter_by=name&filter_string="
+        first = self.client.get(reverse('task_list') + sort_conditions + '&cursor=')
+        self.assertFalse(first.context['page_obj'].has_previous())
+        second = self.client.get(reverse('task_list') + sort_conditions + '&cursor=' + first.context['page_obj'].next_cursor)
+        third = self.client.get(reverse('task_list') + sort_conditions + '&cursor=' + second.context['page_obj'].next_cursor)
+        back = self.client.get(reverse('task_list') + sort_conditions + '&cursor=' + third.context['page_obj'].previous_cursor)
+        self.assertEqual(list(back.context['task_list']), list(second.context['task_list']))
+        self.assertTrue(back.context['page_obj'].has_previous())
+        back = self.client.get(reverse('task_list') + sort_conditions + '&cursor=' + back.context['page_obj'].previous_cursor)
+        self.assertEqual(list(back.context['task_list']), list(first.context['task_list']))
+        self.assertFalse(back.context['page_obj'].has_previous())
+
+    def test_cursor_pagination_query_count(self):
+        """Test that a cursor page does not count the tasks"""
+        self._create_tasks(30)
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('task_list') + '?cursor=')
+        cursor = response.context['page_obj'].next_cursor
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('task_list') + '?cursor=' + cursor)
+        self.assertEqual(len(response.context['task_list']), 7)
+        self.assertNotContains(response, 'Tasks Total')
+
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor or one from another ordering is rejected"""
+        self._create_tasks(30)
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('task_list') + '?cursor=')
+        cursor = response.context['page_obj'].next_cursor
+        self.assertEqual(self.client.get(reverse('task_list') + '?cursor=' + cursor + 'x').status_code, 404)
+        sort_conditions = "?sort_by=name&asc_or_desc=None&filter_by=name&filter_string="
+        self.assertEqual(self.client.get(reverse('task_list') + sort_conditions + '&cursor=' + cursor).status_code, 404)
+
+    def _filtered_names(self, sort_conditions):
+        response = self.client.get(reverse('task_list') + sort_conditions)
+        self.assertEqual(response.status_code, 200)
+        return [task.name for task in response.context['task_list']]
+
+    def test_filter_description_matches_words(self):
+        """Test that filtering by description matches words in any form"""
+        self.client.login(username=self.user.username, password='Password123')
+        names = self._filtered_names("?sort_by=name&asc_or_desc=None&filter_by=description&filter_string=models")
+        self.assertEqual(names, ['Testing'])
+        names = self._filtered_names("?sort_by=name&asc_or_desc=None&filter_by=description&filter_string=tested")
+        self.assertEqual(names, ['Test', 'Testing'])
+        names = self._filtered_names("?sort_by=name&asc_or_desc=None&filter_by=description&filter_string=penguin")
+        self.assertEqual(names, [])
+
+    def test_filter_name_matches_substrings(self):
+        """Test that filtering by name still matches part of a word"""
+        self.client.login(username=self.user.username, password='Password123')
+        names = self._filtered_names("?sort_by=name&asc_or_desc=None&filter_by=name&filter_string=estin")
+        self.assertEqual(names, ['Testing'])
+
+    def test_filter_author_username_matches_substrings(self):
+        """Test that filtering by author username matches part of the username"""
+        self.client.login(username=self.user.username, password='Password123')
+        names = self._filtered_names("?sort_by=name&asc_or_desc=None&filter_by=author__username&filter_string=JOHN")
+        self.assertEqual(names, ['Test', 'Testing'])
+
+    def test_sort_by_relevance(self):
+        """Test that sorting by relevance puts the best matches first, including changes made without saving"""
+        Task.objects.filter(id=10).update(description='Planning the release')
+        task = Task.objects.create(name='Release', description='Ship the release', deadline="2023-11-16T15:43:22.039Z",
+                                   author=self.user, team=self.team)
+        task.members.set([self.user])
+        self.client.login(username=self.user.username, password='Password123')
+        names = self._filtered_names("?sort_by=relevance&asc_or_desc=None&filter_by=description&filter_string=release")
+        self.assertEqual(names, ['Release', 'Test'])
+        names = self._filtered_names("?sort_by=relevance&asc_or_desc=on&filter_by=description&filter_string=release")
+        self.assertEqual(names, ['Test', 'Release'])
+
+    @override_settings(TASK_SEARCH_ENGINE='memory')
+    def test_filter_with_in_memory_search_engine(self):
+        """Test that the list can be filtered and ranked with the in-process search engine"""
+        get_search_engine().rebuild()
+        task = Task.objects.get(id=10)
+        task.name = 'Task list'
+        task.save()
+        self.client.login(username=self.user.username, password='Password123')
+        names = self._filtered_names("?sort_by=relevance&asc_or_desc=None&filter_by=description&filter_string=task")
+        self.assertEqual(names, ['Task list', 'Testing'])
+        names = self._filtered_names("?sort_by=name&asc_or_desc=None&filter_by=name&filter_string=estin")
+        self.assertEqual(names, ['Testing'])
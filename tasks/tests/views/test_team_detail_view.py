@@ -1,7 +1,11 @@
+from django.contrib.messages import get_messages
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from tasks.models import Task, User, Team
+from tasks.models import Notifications, Task, User, Team
+from tasks.tests.helpers import create_users
 
 
 class TeamDetailViewTest(TestCase):
@@ -27,21 +31,23 @@ class TeamDetailViewTest(TestCase):
         """test team details view successfully"""
         self.client.login(username=self.user.username, password='Password123')
         team = Team.objects.get(team_name='test_team')
-        response = self.client.get(reverse('team_detail',args=[team.team_name]))
+        response = self.client.get(reverse('team_detail',args=[team.slug]))
         self.assertEqual(response.status_code, 200)
 
     def test_team_details_template(self):
         """test team detail template use successfully"""
         self.client.login(username=self.user.username, password='Password123')
         team = Team.objects.get(team_name='test_team')
-        response = self.client.get(reverse('team_detail',args=[team.team_name]))
+        response = self.client.get(reverse('team_detail',args=[team.slug]))
         self.assertTemplateUsed(response, 'team_detail.html')
 
     def test_team_details_view(self):
         """test if the team detail show the correct names"""
+        self.team.invite_member(self.team_member1)
+        self.team.invite_member(self.team_member2)
         self.client.login(username=self.user.username, password='Password123')
         team = Team.objects.get(team_name='test_team')
-        response = self.client.get(reverse('team_detail',args=[team.team_name]))
+        response = self.client.get(reverse('team_detail',args=[team.slug]))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, team.team_name)
         self.assertContains(response, self.team_member1.username)
@@ -51,11 +57,65 @@ class TeamDetailViewTest(TestCase):
         """test invite member function in team detail"""
         self.client.login(username=self.user.username, password='Password123')
         team = Team.objects.get(team_name='test_team')
-        invited_user = User.objects.create_user(username='@inviteduser', password='Password123')
-        self.form_input['action'] = 'invite'
-        response = self.client.get(reverse('team_detail', args=[team.team_name]))
+        invited_user = User.objects.create_user(username='@inviteduser', password='Password123',
+                                                email='inviteduser@example.org')
+        self._invite([invited_user.username])
+        response = self.client.get(reverse('team_detail', args=[team.slug]))
         self.assertContains(response,invited_user.username)
 
+    def test_invite_picker_searches_users(self):
+        """test that the invite picker searches for users outside the team instead of listing them all"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('team_detail', args=[self.team.slug]))
+        self.assertContains(response, f'data-url="{reverse("user_search")}?team=test_team"')
+        self.assertNotContains(response, '@petrapickles')
+
+    def test_detail_query_count_does_not_grow_with_users(self):
+        """test that the page takes as many queries however many users there are"""
+        self.client.login(username=self.user.username, password='Password123')
+        url = reverse('team_detail', args=[self.team.slug])
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        create_users('extra', 10)
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(url)
+        self.assertEqual(len(after), len(before))
+
+    def _invite(self, usernames):
+        return self.client.post(reverse('team_detail', args=[self.team.slug]),
+                                {'action': 'invite', 'team_name': self.team.team_name, 'username': usernames})
+
+    def test_invite_members(self):
+        """test that every invited user is added to the team and notified"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self._invite(['@janedoe', '@petrapickles'])
+        self.assertRedirects(response, reverse('team_detail', args=[self.team.slug]))
+        self.assertEqual(set(self.team.team_members.values_list('username', flat=True)),
+                         {'@janedoe', '@petrapickles'})
+        self.assertEqual(Notifications.objects.filter(kind=Notifications.Kind.TEAM_ADDED).count(), 2)
+
+    def test_invite_existing_and_unknown_members(self):
+        """test that members already in the team and unknown usernames are reported, not added"""
+        self.team.invite_member(self.team_member2)
+        self.client.login(username=self.user.username, password='Password123')
+        response = self._invite(['@janedoe', '@nobody', '@petrapickles'])
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertEqual(messages, ['@janedoe is already in the team.', '@nobody does not exist.',
+                                    'Successfully invite @petrapickles.'])
+        self.assertEqual(self.team.team_members.count(), 2)
+        self.assertFalse(Notifications.objects.filter(recipient=self.team_member2).exists())
+
+    def test_invite_query_count_is_constant(self):
+        """test that inviting many users takes as many queries as inviting one"""
+        create_users('invitee', 30)
+        self.client.login(username=self.user.username, password='Password123')
+        with CaptureQueriesContext(connection) as one:
+            self._invite(['@janedoe'])
+        with CaptureQueriesContext(connection) as many:
+            self._invite([f'@invitee{i}' for i in range(30)])
+        self.assertEqual(len(many), len(one))
+        self.assertEqual(self.team.team_members.count(), 31)
+
     def test_team_task_view(self):
         """test if the tasks belong to this team view correctly"""
         self.client.login(username=self.user.username, password='Password123')
@@ -67,25 +127,39 @@ class TeamDetailViewTest(TestCase):
                                        author=self.user,
                                        team=team,
                                        id=10)
-        response = self.client.get(reverse('team_detail', args=[team.team_name]))
+        response = self.client.get(reverse('team_detail', args=[team.slug]))
         self.assertContains(response, task.name)
 
     def test_if_no_task_in_team(self):
         """test message shows if no task in team"""
         self.client.login(username=self.user.username, password='Password123')
         team = Team.objects.get(team_name='test_team')
-        response = self.client.get(reverse('team_detail', args=[team.team_name]))
+        response = self.client.get(reverse('team_detail', args=[team.slug]))
         self.assertContains(response, "No tasks in this team")
 
     def test_delete_team(self):
         """test delete team function"""
         self.client.login(username=self.user.username, password='Password123')
         team = Team.objects.get(team_name='test_team')
-        response = self.client.get(reverse("delete_team",args=[team.team_name]))
+        response = self.client.get(reverse("delete_team",args=[team.slug]))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Are you sure you want to delete")
-        response = self.client.post(reverse("delete_team",args=[team.team_name]))
+        response = self.client.post(reverse("delete_team",args=[team.slug]))
         self.assertEqual(response.status_code, 302)
         self.assertFalse(Team.objects.filter(team_name=team.team_name).exists())
         self.assertRedirects(response, reverse('team_list'))
 
+
+    def test_detail_query_count_is_fixed(self):
+        """test that the page takes a fixed number of queries however many members and tasks the team has"""
+        members = create_users('member', 20)
+        self.team.team_members.add(self.user, *members)
+        for i in range(10):
+            Task.objects.create(name=f'Task {i}', description='Team task', deadline='2023-11-16T15:43:22.039Z',
+                                author=self.user, team=self.team)
+        self.client.login(username=self.user.username, password='Password123')
+        # Session, user, team with its admin, members and tasks
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('team_detail', args=[self.team.slug]))
+        self.assertContains(response, '@member19')
+        self.assertContains(response, 'Task 9')
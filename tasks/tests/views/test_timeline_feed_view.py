@@ -0,0 +1,95 @@
+"""Tests of the timeline feed view."""
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from tasks.models import Task, Team, User
+
+
+class TimelineFeedViewTestCase(TestCase):
+    """Tests of the timeline feed view."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+        'tasks/tests/fixtures/default_team.json',
+        'tasks/tests/fixtures/default_task.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.team = Team.objects.get(team_name='Default Team')
+        self.task = Task.objects.get(pk=1)
+        self.url = reverse('timeline_feed') + '?start=2023-11-01&end=2023-12-01'
+        self.client.login(username=self.user.username, password='Password123')
+
+    def test_timeline_feed_url(self):
+        """Test that url is correct"""
+        self.assertEqual(reverse('timeline_feed'), '/timeline/feed')
+
+    def test_feed_returns_tasks_in_window(self):
+        """Test that the feed lists the user's tasks due within the window"""
+        Task.objects.create(name='Later', description='Outside the window', deadline='2023-12-05T10:00:00Z',
+                            author=self.user, team=self.team)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'tasks': [{
+            'id': self.task.id,
+            'name': self.task.name,
+            'deadline': '2023-11-16T15:43:22.039000+00:00',
+            'priority': self.task.priority,
+            'team': self.team.team_name,
+        }]})
+
+    def test_feed_excludes_other_users_tasks(self):
+        """Test that the feed does not list tasks authored by other users"""
+        other_user = User.objects.get(username='@janedoe')
+        Task.objects.create(name='Not mine', description='Another user task', deadline='2023-11-20T10:00:00Z',
+                            author=other_user, team=self.team)
+        response = self.client.get(self.url)
+        self.assertEqual([task['name'] for task in response.json()['tasks']], [self.task.name])
+
+    def test_feed_rejects_malformed_window(self):
+        """Test that the feed rejects missing, malformed, reversed or oversized windows"""
+        for params in ['', '?start=2023-11-01', '?start=bad&end=2023-12-01', '?start=2023-12-01&end=2023-11-01',
+                       '?start=2020-01-01&end=2023-01-01']:
+            response = self.client.get(reverse('timeline_feed') + params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_feed_is_not_modified_for_matching_etag(self):
+        """Test that repeat fetches with the returned validators get a 304"""
+        response = self.client.get(self.url)
+        self.assertTrue(response.has_header('ETag'))
+        with self.assertNumQueries(3):
+            repeat = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_feed_has_no_last_modified(self):
+        """Test that only the ETag is offered, so deleting a task cannot leave a client with a stale feed"""
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        since = http_date(timezone.now().timestamp())
+        self.task.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_feed_etag_changes_when_task_changes(self):
+        """Test that editing or deleting a task in the window changes the ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.task.name = 'Renamed'
+        self.task.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        Task.objects.create(name='Second', description='Another task', deadline='2023-11-02T10:00:00Z',
+                            author=self.user, team=self.team)
+        Task.objects.filter(name='Second').delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.task.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_feed_redirects_when_not_logged_in(self):
+        """Test user is redirected to the login page if not logged in"""
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,114 @@
+"""Tests of the timeline views."""
+from datetime import date
+from zoneinfo import ZoneInfo
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tasks.html_util.timeline import Timeline
+from tasks.models import Task, Team, User
+
+
+class TimelineViewTestCase(TestCase):
+    """Tests of the timeline views."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/default_team.json',
+        'tasks/tests/fixtures/default_task.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.team = Team.objects.get(team_name='Default Team')
+        self.task = Task.objects.get(pk=1)
+
+    def _create_tasks(self, count):
+        for i in range(count):
+            Task.objects.create(name=f'Task {i}', description='Extra task', deadline=f'2023-{i % 12 + 1:02}-10T12:00:00Z',
+                                author=self.user, team=self.team)
+
+    def test_timeline_year_shows_task(self):
+        """Test that tasks are displayed in the year they are due"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('timeline_year', kwargs={'year': 2023}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'timeline.html')
+        self.assertContains(response, self.task.name)
+
+    def test_timeline_year_hides_other_years(self):
+        """Test that tasks are not displayed in other years"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('timeline_year', kwargs={'year': 2024}))
+        self.assertNotContains(response, self.task.name)
+
+    def test_timeline_only_renders_current_year(self):
+        """Test that the timeline renders the current year and links to the others"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('timeline'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'<h1> {timezone.localdate().year} </h1>', html=False)
+        self.assertNotContains(response, '<h1> 2023 </h1>', html=False)
+        self.assertNotContains(response, self.task.name)
+        self.assertContains(response, reverse('timeline_year', kwargs={'year': 2023}))
+
+    def test_timeline_renders_requested_year(self):
+        """Test that the timeline renders the year given in the url params"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('timeline') + '?year=2023')
+        self.assertContains(response, '<h1> 2023 </h1>', html=False)
+        self.assertContains(response, self.task.name)
+
+    def test_timeline_ignores_malformed_year(self):
+        """Test that the timeline falls back to the current year when the requested one is malformed"""
+        self.client.login(username=self.user.username, password='Password123')
+        response = self.client.get(reverse('timeline') + '?year=bad')
+        self.assertContains(response, f'<h1> {timezone.localdate().year} </h1>', html=False)
+
+    def test_timeline_year_out_of_range(self):
+        """Test that years whose window would run past the last date are not found rather than failing"""
+        self.client.login(username=self.user.username, password='Password123')
+        self.assertEqual(self.client.get(reverse('timeline_year', kwargs={'year': 9999})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('timeline_year', kwargs={'year': 0})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('timeline_year', kwargs={'year': 9998})).status_code, 200)
+
+    def test_timeline_month_out_of_range(self):
+        """Test that months that do not exist are not found rather than failing"""
+        self.client.login(username=self.user.username, password='Password123')
+        self.assertEqual(self.client.get(reverse('timeline_month', kwargs={'year': 9999, 'month': 12})).status_code,
+                         404)
+        self.assertEqual(self.client.get(reverse('timeline_month', kwargs={'year': 2023, 'month': 13})).status_code,
+                         404)
+        self.assertEqual(self.client.get(reverse('timeline_month', kwargs={'year': 2023, 'month': 0})).status_code,
+                         404)
+
+    def test_timeline_redirects_when_not_logged_in(self):
+        """Test user is redirected to the login page if not logged in"""
+        response = self.client.get(reverse('timeline'))
+        self.assertRedirects(response, '/log_in/?next=/timeline/', status_code=302, target_status_code=200)
+
+    def test_timeline_uses_one_query(self):
+        """Test that a timeline page is built from a single task query"""
+        self._create_tasks(20)
+        with self.assertNumQueries(1):
+            Timeline(self.user).returnHTMLPages(2023)
+
+    def test_timeline_year_query_count_independent_of_tasks(self):
+        """Test that the year view runs the same number of queries however many tasks are shown"""
+        self.client.login(username=self.user.username, password='Password123')
+        url = reverse('timeline_year', kwargs={'year': 2023})
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        self._create_tasks(20)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+    def test_tasks_bucketed_by_local_day(self):
+        """Test that tasks are grouped by the day they are due in the active timezone"""
+        with timezone.override(ZoneInfo('Asia/Tokyo')):
+            calendar = Timeline(self.user)
+            calendar.load_tasks(date(2023, 11, 1), date(2023, 12, 1))
+        self.assertEqual(calendar.tasks_by_day[date(2023, 11, 17)], [self.task])
+        self.assertNotIn(date(2023, 11, 16), calendar.tasks_by_day)
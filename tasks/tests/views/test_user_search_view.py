@@ -0,0 +1,76 @@
+"""Tests of the user search view."""
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from tasks.models import Team, User
+from tasks.tests.helpers import create_users
+
+
+class UserSearchViewTestCase(TestCase):
+    """Tests of the user search view."""
+
+    fixtures = [
+        'tasks/tests/fixtures/default_user.json',
+        'tasks/tests/fixtures/other_users.json',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.get(username='@johndoe')
+        self.url = reverse('user_search')
+        self.client.login(username=self.user.username, password='Password123')
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [user['username'] for user in response.json()['users']]
+
+    def test_search_requires_login(self):
+        """Test that anonymous users are sent to log in"""
+        self.client.logout()
+        response = self.client.get(self.url, {'q': 'jo'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_search_matches_username_prefix(self):
+        """Test that usernames match from the start, with or without the @"""
+        self.assertEqual(self.search(q='pe'), ['@peterpickles', '@petrapickles'])
+        self.assertEqual(self.search(q='@PETE'), ['@peterpickles'])
+        self.assertEqual(self.search(q='ickles'), [])
+
+    def test_search_matches_name_prefix(self):
+        """Test that first and last names match from the start, ignoring case"""
+        response = self.client.get(self.url, {'q': 'doe'})
+        self.assertEqual(response.json()['users'], [
+            {'username': '@janedoe', 'name': 'Jane Doe'},
+            {'username': '@johndoe', 'name': 'John Doe'},
+        ])
+
+    def test_empty_search(self):
+        """Test that an empty query returns nobody"""
+        self.assertEqual(self.search(q=' '), [])
+
+    @override_settings(USER_SEARCH_RESULTS=3)
+    def test_search_is_limited(self):
+        """Test that no more than USER_SEARCH_RESULTS users are returned"""
+        create_users('doe', 5, first_name='Doe', last_name='Doe')
+        self.assertEqual(len(self.search(q='doe')), 3)
+
+    def test_search_leaves_out_team_members(self):
+        """Test that the members of the given team are left out"""
+        team = Team.objects.create(team_name='Pickles', team_admin=self.user)
+        team.team_members.add(User.objects.get(username='@petrapickles'))
+        self.assertEqual(self.search(q='pe', team=team.slug), ['@peterpickles'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL')
+    def test_search_uses_prefix_indexes(self):
+        """Test that the prefix matches are answered from the pattern indexes"""
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = User.objects.filter(Q(username__istartswith='@jo') | Q(first_name__istartswith='jo')
+                                   | Q(last_name__istartswith='jo')).explain()
+        self.assertNotIn('Seq Scan', plan)
+        for index in ['user_username_prefix_idx', 'user_first_name_prefix_idx', 'user_last_name_prefix_idx']:
+            self.assertIn(index, plan)
@@ -1,41 +1,83 @@
-from datetime import datetime
+from datetime import datetime, time, timedelta, MINYEAR, MAXYEAR
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ImproperlyConfigured
-from django.http import HttpResponseRedirect
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from formtools.wizard.views import SessionWizardView
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.safestring import mark_safe
 from django.views import View
 from django.views.generic import ListView, DetailView, TemplateView, RedirectView
 from django.views.generic.edit import FormView, UpdateView, DeleteView
 from django.urls import reverse, reverse_lazy
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
 from tasks.forms import LogInForm, PasswordForm, UserForm, SignUpForm, CreateTaskForm1, CreateTaskForm2, TeamCreateForm, InviteMemberForm, TaskSortForm, ModifyTaskForm, TimeEntryForm, ModifyTaskMembersForm
 from tasks.forms import LogInForm, PasswordForm, UserForm, SignUpForm, CreateTaskForm1, CreateTaskForm2, TeamCreateForm, \
     InviteMemberForm, \
     TaskSortForm, ModifyTaskForm, TimeEntryForm
 from tasks.helpers import login_prohibited
+from tasks.middleware import query_budget
 from .models import Task, Team, User, TimeLogging, Notifications
+from .dashboard import dashboard_tasks
+from .html_util.ical import calendar_feed_token, get_calendar_feed_user, revoke_calendar_feed_token, stream_calendar
 from .html_util.timeline import Timeline
+from .notification_stream import decode_position, latest_position, poll_notifications, stream_notifications
+from .notifications import mark_read, notify
+from .pagination import InvalidCursor, KeysetPaginator
+from .search import search_tasks
 
 
+def task_etag(tasks, *variant):
+    """Returns an ETag that changes whenever a task in the queryset is edited, added or removed, from a single query.
+
+    There is no Last-Modified to go with it, as removing a task leaves the newest edit time unchanged."""
+    state = tasks.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    newest = state['last_modified'].timestamp() if state['last_modified'] else 0
+    return '"' + '-'.join([str(state['count']), str(newest), *variant]) + '"'
+
+
+@query_budget(6)
 @login_required
 def dashboard(request):
     """Display the current user's dashboard."""
 
     current_user = request.user
-    today = timezone.now()
-    upcoming_tasks = Task.objects.filter(members=current_user, deadline__gte=today).order_by('deadline')[:10]
-    overdue_tasks = Task.objects.filter(members=current_user, deadline__lt=today).order_by('deadline')[:10]
+    upcoming_tasks, overdue_tasks = dashboard_tasks(current_user)
     context = {'user': current_user, 'upcoming_tasks':upcoming_tasks, 'overdue_tasks':overdue_tasks}
     return render(request, 'dashboard.html', context)
 
+@query_budget(3)
+@login_required
+def user_search(request):
+    """Returns the users whose username, first or last name starts with the q parameter, as JSON.
+
+    At most USER_SEARCH_RESULTS users are returned, leaving out the members of the team whose slug is given
+    as the team parameter, if any. Usernames match with or without their leading @."""
+    query = request.GET.get('q', '').strip().lstrip('@')
+    if not query:
+        return JsonResponse({'users': []})
+    users = User.objects.filter(Q(username__istartswith=f'@{query}') | Q(first_name__istartswith=query)
+                                | Q(last_name__istartswith=query))
+    team_slug = request.GET.get('team')
+    if team_slug:
+        users = users.exclude(teams__slug=team_slug)
+    limit = getattr(settings, 'USER_SEARCH_RESULTS', 10)
+    return JsonResponse({'users': [
+        {'username': user['username'], 'name': f'{user["first_name"]} {user["last_name"]}'}
+        for user in users.order_by('username').values('username', 'first_name', 'last_name')[:limit]
+    ]})
+
+
 @login_prohibited
 def home(request):
     """Display the application's start/home screen."""
@@ -51,12 +93,26 @@ def timezone_select(request):
         return redirect('/')
 
 class TaskListView(LoginRequiredMixin, ListView):
-    """View the task list"""
+    """View the task list, paged by page number, or by cursor when a cursor param is given"""
     model = Task
     template_name = 'task_list.html'
     context_object_name = 'task_list'
+    paginate_by = 25
+    # Most queries a request may run, checked by QueryInstrumentationMiddleware
+    query_budget = 6
     # Used to fill the sorting form with the user's previous input
     user_request = None
+    sort_field = "participant_deadline"
+    descending = False
+    # Sort options read from the user's participant row, so a deadline sort walks the (user, deadline) index
+    participant_sort_fields = {"deadline": "participant_deadline", "priority": "participant_priority"}
+
+    def get_user_tasks(self):
+        """Tasks the user is assigned to or authored, each listed once as they have one participant row each"""
+        return (Task.objects.filter(participants__user=self.request.user)
+                .annotate(participant_deadline=F('participants__deadline'),
+                          participant_priority=F('participants__priority'))
+                .select_related('team', 'author'))
 
     def get_queryset(self):
         """Filter tasks based on the logged-in user + sort criteria"""
@@ -67,57 +123,58 @@ class TaskListView(LoginRequiredMixin, ListView):
             else:
                 request['asc_or_desc'] = False
 
+        tasks = self.get_user_tasks()
         form = TaskSortForm(request)
         if form.is_valid():
             self.user_request = request
 
-            if form.cleaned_data.get("asc_or_desc"):
-                sort_by = "-" + form.cleaned_data.get("sort_by")
+            sort_field = form.cleaned_data.get("sort_by")
+            self.sort_field = self.participant_sort_fields.get(sort_field, sort_field)
+            self.descending = form.cleaned_data.get("asc_or_desc")
+            if self.sort_field == "relevance":
+                # Most relevant first, unless reversed
+                self.descending = not self.descending
+            if self.descending:
+                sort_by = "-" + self.sort_field
+                tie_breaker = "-id"
             else:
-                sort_by = form.cleaned_data.get("sort_by")
-            filter_by = self.request.GET.get("filter_by") + "__icontains"
-            filter_string = self.request.GET.get("filter_string", "")
-
-            tasks = Task.objects.filter(
-                Q(members=self.request.user) | Q(author=self.request.user),
-                **{filter_by: filter_string}
-            ).order_by(sort_by)
-            # a set to avoid duplication
-            unique_task_identifiers = set()
-            unique_tasks = []
-            for task in tasks:
-                task_identifier = (
-                task.name, task.deadline, task.priority, task.team, task.author)
-                if task_identifier not in unique_task_identifiers:
-                    unique_tasks.append(task)
-                    unique_task_identifiers.add(task_identifier)
-
-            return unique_tasks
+                sort_by = self.sort_field
+                tie_breaker = "id"
+            filter_by = form.cleaned_data.get("filter_by")
+            filter_string = form.cleaned_data.get("filter_string", "")
+
+            tasks = search_tasks(tasks, filter_by, filter_string, ranked=self.sort_field == "relevance")
+            return tasks.order_by(sort_by, tie_breaker)
 
         else:
             # If sort criteria is malformed use default sort
-
-            tasks = Task.objects.filter(Q(members=self.request.user) | Q(author=self.request.user)).order_by("deadline")
-            # a set to avoid duplication
-            unique_task_identifiers = set()
-            unique_tasks = []
-            for task in tasks:
-                task_identifier = (
-                task.deadline, task.priority, task.team, task.author,task.name)
-                if task_identifier not in unique_task_identifiers:
-                    unique_tasks.append(task)
-                    unique_task_identifiers.add(task_identifier)
-
-            return unique_tasks
+            return tasks.order_by(self.sort_field, "id")
+
+    def paginate_queryset(self, queryset, page_size):
+        """Seek to the page after the given cursor, rather than counting and offsetting rows"""
+        if 'cursor' not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, self.sort_field, page_size, descending=self.descending)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['cursor_paginated'] = 'cursor' in self.request.GET
         if self.user_request is not None:
             context['form'] = TaskSortForm(self.user_request)
         else:
             context['form'] = TaskSortForm()
         # Need current date to show which tasks are overdue
         context['today'] = timezone.now()
+        # Sort criteria to carry over to the other pages
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params.pop('cursor', None)
+        context['sort_params'] = params.urlencode()
         return context
 
     def post(self, request, *args, **kwargs):
@@ -135,6 +192,7 @@ class TaskDetailView(LoginRequiredMixin, DetailView):
     model = Task
     template_name = 'task_detail.html'
     context_object_name = 'task'
+    query_budget = 10
 
     def get_object(self, queryset=None):
         """get the current task"""
@@ -206,66 +264,74 @@ class TeamDetailView(LoginRequiredMixin, DetailView):
     model = Team
     template_name = 'team_detail.html'
     context_object_name = 'team'
+    query_budget = 5
+
+    def get_queryset(self):
+        """Loads the admin and members along with the team, as the page shows them all"""
+        return Team.objects.select_related('team_admin').prefetch_related('team_members')
 
     def get_object(self, queryset=None):
         """get the current task"""
-        return get_object_or_404(Team, team_name=self.kwargs['team_name'])
+        if queryset is None:
+            queryset = self.get_queryset()
+        return get_object_or_404(queryset, slug=self.kwargs['slug'])
 
     def get_context_data(self, **kwargs):
         """set the context data"""
         context = super().get_context_data(**kwargs)
-        tasks = Task.objects.filter(team=self.get_object())
+        # Only the columns the task links need, evaluated once for both the check and the loop
+        tasks = list(Task.objects.filter(team=self.object).only('id', 'name').order_by('deadline', 'id'))
         context['team_task'] = tasks
-        if not tasks.exists():
+        if not tasks:
             context['no_task'] = True
-        context['all_users'] = User.objects.all()
-        context['invite_form'] = InviteMemberForm()
+        context['invite_form'] = InviteMemberForm(instance=self.object)
         return context
 
     def post(self, request, *args, **kwargs):
         """post function prepares for deleting and inviting people from team"""
-        team = self.get_object()
+        team = self.get_object(Team.objects.select_related('team_admin'))
         action = request.POST.get('action')
 
         if action == 'invite':
             form = InviteMemberForm(request.POST, instance=team)
             users_to_invite = request.POST.getlist('username')
             if form.is_valid():
-                for username in users_to_invite:
-                    user = User.objects.get(username=username)
-
-                    #  check if the user is already in the team
-
-                    if user in team.team_members.all():
+                # Look up every invitee and the current members once, however many are invited
+                users = {user.username: user for user in User.objects.filter(username__in=users_to_invite)}
+                member_ids = set(team.team_members.values_list('pk', flat=True))
+                invited = []
+                for username in dict.fromkeys(users_to_invite):
+                    user = users.get(username)
+                    if user is None:
+                        messages.error(request, f'{username} does not exist.')
+                    elif user.pk in member_ids:
                         messages.error(request, f'{user.username} is already in the team.')
                     else:
-                        team.team_members.add(user)
-
-                        #Create a notification for the invited user
-                        Notifications.objects.create(
-                            recipient = user,
-                            sender = team.team_admin,
-                            message = f'You have been added to the team: {team.team_name}. ',
-                        )
+                        member_ids.add(user.pk)
+                        invited.append(user)
                         messages.success(request, f'Successfully invite {user.username}.')
+                # Add and notify the invited users together, so neither survives without the other
+                with transaction.atomic():
+                    team.team_members.add(*invited)
+                    notify(invited, team.team_admin, f'You have been added to the team: {team.team_name}. ',
+                           kind=Notifications.Kind.TEAM_ADDED)
 
         elif action == 'remove':
             username = request.POST.get('username')
             user_to_remove = get_object_or_404(User, username=username)
 
             if request.user == team.team_admin:
-                team.team_members.remove(user_to_remove)
-                # Create a notification for the removed user
-                Notifications.objects.create(
-                            recipient = user_to_remove,
-                            sender = team.team_admin,
-                            message = f'You have been removed from the team: {team.team_name}. ',
-                        )
+                with transaction.atomic():
+                    team.team_members.remove(user_to_remove)
+                    # Create a notification for the removed user
+                    notify([user_to_remove], team.team_admin,
+                           f'You have been removed from the team: {team.team_name}. ',
+                           kind=Notifications.Kind.TEAM_REMOVED)
                 messages.success(request, f'{user_to_remove.username} is removed from the team.')
             else:
                 messages.error(request, 'You do not have permission to remove member')
 
-        return HttpResponseRedirect(reverse('team_detail', kwargs={'team_name': team.team_name}))
+        return HttpResponseRedirect(reverse('team_detail', kwargs={'slug': team.slug}))
 
 
 class LoginProhibitedMixin:
@@ -422,16 +488,11 @@ class CreateTaskWizard(SessionWizardView):
         task_priority = form_list[0].cleaned_data.get("priority")
         task = Task(name=task_name, description=task_description, deadline=task_deadline, priority=task_priority,
                     author=self.request.user, team=task_team)
-        task.save()
-        task.members.set(form_list[1].cleaned_data.get('members'))
-        team_members = task.members.all()
-        for member in team_members:
-            Notifications.objects.create(
-                recipient=member,
-                sender=self.request.user,
-                message=f'You have been assigned to a new task: {task.name}.',
-                task=task,
-            )
+        with transaction.atomic():
+            task.save()
+            task.members.set(form_list[1].cleaned_data.get('members'))
+            notify(task.members.all(), self.request.user, f'You have been assigned to a new task: {task.name}.',
+                   task=task, kind=Notifications.Kind.TASK_ASSIGNED)
         return HttpResponseRedirect(reverse(settings.REDIRECT_URL_WHEN_LOGGED_IN))
 
 
@@ -450,14 +511,11 @@ class TeamView(LoginRequiredMixin, FormView):
     def form_valid(self, form):
         """Handle valid form by saving the new team."""
         if form.is_valid():
-            form.save()
-            team = form.save()
-            for member in team.team_members.all():
-                Notifications.objects.create(
-                            recipient = member,
-                            sender = team.team_admin,
-                            message = f'You have been added to the team: {team.team_name}. ',
-                        )
+            with transaction.atomic():
+                form.save()
+                team = form.save()
+                notify(team.team_members.all(), team.team_admin,
+                       f'You have been added to the team: {team.team_name}. ', kind=Notifications.Kind.TEAM_ADDED)
             messages.success(self.request, "Team created!")
             return redirect('dashboard')
         return self.form_invalid(form)
@@ -468,27 +526,44 @@ class TeamView(LoginRequiredMixin, FormView):
 
 
 class TimelineView(LoginRequiredMixin, TemplateView, RedirectView):
-    """Displays tasks in a calendar style from 2023 to the current year + 5"""
+    """Displays tasks in a calendar style for the current or requested year, linking to the years around it"""
     template_name = ('timeline.html')
+    query_budget = 4
+
+    def get_year(self):
+        """Returns the year given in the url params, or None if it is missing or malformed"""
+        try:
+            year = int(self.request.GET.get('year', ''))
+        except ValueError:
+            return None
+        if MINYEAR <= year < MAXYEAR:
+            return year
+        return None
 
     def get_context_data(self, **kwargs):
         """Passes HTML to represent the calendar to the template"""
         context = super().get_context_data(**kwargs)
         calendar = Timeline(self.request.user)
-        html_calendar = calendar.returnHTMLPages()
+        html_calendar = calendar.returnHTMLPages(self.get_year())
         context["timeline_calendar"] = mark_safe(html_calendar)
+        context["calendar_feed_url"] = self.request.build_absolute_uri(
+            reverse('calendar_feed', kwargs={'token': calendar_feed_token(self.request.user)}))
         return context
 
 
 class TimelineYearView(LoginRequiredMixin, TemplateView, RedirectView):
     """Displays tasks in a calendar style for a given year"""
     template_name = ('timeline.html')
+    query_budget = 4
 
     def get_context_data(self, **kwargs):
         """Passes HTML to represent the calendar for that year to the template"""
         context = super().get_context_data(**kwargs)
+        # The year's window ends at the start of the next one, which has to exist too
+        if not MINYEAR <= self.kwargs['year'] < MAXYEAR:
+            raise Http404("No timeline for that year")
         calendar = Timeline(self.request.user)
-        html_calendar = calendar.formatyear(self.kwargs['year'])
+        html_calendar = calendar.returnHTMLPages(self.kwargs['year'])
         context["timeline_calendar"] = mark_safe(html_calendar)
         return context
 
@@ -496,21 +571,112 @@ class TimelineYearView(LoginRequiredMixin, TemplateView, RedirectView):
 class TimelineMonthView(LoginRequiredMixin, TemplateView, RedirectView):
     """Displays tasks in a calendar style for a given month within a year"""
     template_name = ('timeline.html')
+    query_budget = 4
 
     def get_context_data(self, **kwargs):
         """Passes HTML to represent the calendar for that month to the template"""
         context = super().get_context_data(**kwargs)
+        if not MINYEAR <= self.kwargs['year'] < MAXYEAR or not 1 <= self.kwargs['month'] <= 12:
+            raise Http404("No timeline for that month")
         calendar = Timeline(self.request.user)
         html_calendar = calendar.formatmonth(self.kwargs['year'], self.kwargs['month'])
         context["timeline_calendar"] = mark_safe(html_calendar)
         return context
 
 
+class TimelineFeedView(LoginRequiredMixin, View):
+    """Returns the user's tasks due within a date window as JSON, for rendering the calendar client-side"""
+
+    http_method_names = ['get']
+    max_window = timedelta(days=366)
+
+    def parse_bound(self, name):
+        """Returns the url param as an aware datetime, accepting a date (local midnight) or a datetime"""
+        value = self.request.GET.get(name, '')
+        try:
+            bound = parse_datetime(value)
+            if bound is None:
+                day = parse_date(value)
+                if day is None:
+                    return None
+                bound = datetime.combine(day, time.min)
+        except ValueError:
+            return None
+        if timezone.is_naive(bound):
+            bound = timezone.make_aware(bound)
+        return bound
+
+    def get(self, request, *args, **kwargs):
+        start = self.parse_bound('start')
+        end = self.parse_bound('end')
+        if start is None or end is None:
+            return JsonResponse({'error': 'start and end must be ISO 8601 dates or datetimes.'}, status=400)
+        if not timedelta(0) < end - start <= self.max_window:
+            return JsonResponse({'error': f'end must be after start and within {self.max_window.days} days of it.'},
+                                status=400)
+
+        tasks = request.user.task_set.filter(deadline__gte=start, deadline__lt=end)
+
+        etag = task_etag(tasks, timezone.get_current_timezone_name())
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+        response = JsonResponse({'tasks': [
+            {
+                'id': task['id'],
+                'name': task['name'],
+                'deadline': timezone.localtime(task['deadline']).isoformat(),
+                'priority': task['priority'],
+                'team': task['team__team_name'],
+            }
+            for task in tasks.order_by('deadline').values('id', 'name', 'deadline', 'priority', 'team__team_name')
+        ]})
+        response['ETag'] = etag
+        return response
+
+
+class CalendarFeedView(View):
+    """Streams an iCalendar feed of the tasks a user is assigned to, authenticated by a per-user token"""
+
+    http_method_names = ['get', 'head']
+
+    def get(self, request, token, *args, **kwargs):
+        user = get_calendar_feed_user(token)
+        if user is None:
+            raise Http404("Calendar feed not found")
+
+        tasks = Task.objects.filter(members=user)
+        etag = task_etag(tasks)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+        response = StreamingHttpResponse(stream_calendar(tasks.order_by('deadline'), request.get_host()),
+                                         content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="tasks.ics"'
+        response['ETag'] = etag
+        return response
+
+
+class RevokeCalendarFeedView(LoginRequiredMixin, View):
+    """Replaces the user's calendar feed URL with a new one, for when the old one has been shared or leaked"""
+
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        revoke_calendar_feed_token(request.user)
+        messages.add_message(request, messages.SUCCESS,
+                             "Your calendar feed URL has been replaced; subscribe to the new one below.")
+        return redirect('timeline')
+
+
 class ModifyTaskView(LoginRequiredMixin, UpdateView):
 
     model = Task
     template_name = "modify_task.html"
     form_class = ModifyTaskForm
+    query_budget = 8
 
     def get_object(self, queryset=None):
         task = super().get_object(queryset=queryset)
@@ -522,54 +688,41 @@ class ModifyTaskView(LoginRequiredMixin, UpdateView):
         return context
 
     def form_valid(self, form):
-        task = form.save(commit=False)
-
-        # Process the modify members form
-        modify_members_form = ModifyTaskMembersForm(
-            self.request.POST,
-            instance=task,
-            initial={'add_members': task.members.all(), 'remove_members': task.members.all()}
-        )
-
-        if modify_members_form.is_valid():
-            add_members = modify_members_form.cleaned_data.get('add_members')
-            remove_members = modify_members_form.cleaned_data.get('remove_members')
-
-            # Add new members
-            for member in add_members:
-                if member not in task.members.all():  # Check if the member is not already in the task
-                    task.members.add(member)
-
-                    # Notify added members about the assignment
-                    Notifications.objects.create(
-                        recipient=member,
-                        sender=self.request.user,
-                        message=f'You have been assigned to the task: {task.name}.',
-                    )
-
-            # Remove members
-            for member in remove_members:
-                if member in task.members.all():  # Check if the member is in the task
-                    task.members.remove(member)
-
-                    # Notify removed members about the removal
-                    Notifications.objects.create(
-                        recipient=member,
-                        sender=self.request.user,
-                        message=f'You have been removed from the task: {task.name}.',
-                    )
-
-        task.save()
-
-        # Notify team members about the modification
-        for member in task.members.all():
-            Notifications.objects.create(
-                recipient=member,
-                sender=self.request.user,
-                message=f'Task: {task.name} has been modified.',
+        # Save the task, its members and every notification about them as one change
+        with transaction.atomic():
+            task = form.save(commit=False)
+
+            # Process the modify members form
+            modify_members_form = ModifyTaskMembersForm(
+                self.request.POST,
+                instance=task,
+                initial={'add_members': task.members.all(), 'remove_members': task.members.all()}
             )
 
-        return super().form_valid(form)
+            if modify_members_form.is_valid():
+                add_members = modify_members_form.cleaned_data.get('add_members')
+                remove_members = modify_members_form.cleaned_data.get('remove_members')
+
+                # Diff against the current members, loaded once, and apply each side in one go
+                member_ids = set(task.members.values_list('pk', flat=True))
+                added = [member for member in add_members if member.pk not in member_ids]
+                removed = [member for member in remove_members if member.pk in member_ids]
+                task.members.add(*added)
+                task.members.remove(*removed)
+
+                # Notify added and removed members
+                notify(added, self.request.user, f'You have been assigned to the task: {task.name}.', task=task,
+                       kind=Notifications.Kind.TASK_ASSIGNED)
+                notify(removed, self.request.user, f'You have been removed from the task: {task.name}.', task=task,
+                       kind=Notifications.Kind.TASK_UNASSIGNED)
+
+            task.save()
+
+            # Notify team members about the modification, merged with their earlier ones about this task
+            notify(task.members.all(), self.request.user, f'Task: {task.name} has been modified.', task=task,
+                   kind=Notifications.Kind.TASK_MODIFIED)
+
+            return super().form_valid(form)
 
     def get_success_url(self):
         messages.add_message(self.request, messages.SUCCESS, "Task Updated Successfully")
@@ -583,42 +736,86 @@ class DeleteTaskView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('task_list')
 
     def form_valid(self, form):
-        # Notify assigned members before deleting the task
-        for member in self.object.members.all():
-            Notifications.objects.create(
-                recipient=member,
-                sender=self.request.user,
-                message=f'Task "{self.object.name}" has been deleted.',
-            )
+        with transaction.atomic():
+            # Notify assigned members before deleting the task
+            notify(self.object.members.all(), self.request.user, f'Task "{self.object.name}" has been deleted.',
+                   kind=Notifications.Kind.TASK_DELETED)
 
-        # Perform the deletion
-        response = super().form_valid(form)
+            # Perform the deletion
+            response = super().form_valid(form)
 
     # Redirect to the success URL
         messages.success(self.request, "Task Deleted Successfully")
         return response
 
 
-class InboxPageView(ListView):
+class InboxPageView(LoginRequiredMixin, ListView):
+    """View the user's notifications newest first, paged by cursor"""
     model = Notifications
     template_name = 'inbox_page.html'
     context_object_name = 'notifications'
-    ordering = ['-timestamp']
+    query_budget = 4
+    paginate_by = 25
 
     def get_queryset(self):
-        return self.model.objects.filter(recipient=self.request.user)
+        notifications = self.model.objects.filter(recipient=self.request.user).select_related('sender', 'task')
+        if self.request.GET.get('unread'):
+            notifications = notifications.filter(read_at__isnull=True)
+        return notifications
+
+    def paginate_queryset(self, queryset, page_size):
+        """Seek to the page after the given cursor, so deep pages of a long inbox stay cheap"""
+        paginator = KeysetPaginator(queryset, 'timestamp', page_size, descending=True)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['unread_only'] = bool(self.request.GET.get('unread'))
+        return context
 
     def post(self, request, *args, **kwargs):
         action = request.POST.get('action')
 
         if action == 'read_all':
-            # Delete all notifications for the current user
-            Notifications.objects.filter(recipient=request.user).delete()
+            # Mark every unread notification as read in a single UPDATE
+            mark_read(Notifications.objects.all(), request.user)
             messages.success(request, 'All notifications have been marked as read.')
+        elif action == 'read':
+            notification = request.POST.get('notification', '')
+            # isdigit() also passes digits such as '²' that the pk lookup cannot convert
+            if notification.isascii() and notification.isdecimal():
+                mark_read(Notifications.objects.filter(pk=notification), request.user)
 
         return HttpResponseRedirect(reverse_lazy('inbox'))
 
 
+async def notification_stream(request):
+    """Streams the logged-in user's new notifications as server-sent events.
+
+    Under ASGI the stream stays open and idle streams hold no thread. Under WSGI, where an open stream would
+    hold a worker, it only sends what is new and ends, and the browser polls by reconnecting. Either way
+    clients resume after the last event they saw by sending its id in the Last-Event-ID header, as browsers
+    do when they reconnect."""
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return HttpResponse(status=401)
+    after = decode_position(request.headers.get('Last-Event-ID', ''))
+    if after is None:
+        after = await sync_to_async(latest_position)(user.pk)
+    if isinstance(request, ASGIRequest):
+        content = stream_notifications(user.pk, after)
+    else:
+        content = await sync_to_async(poll_notifications)(user.pk, after)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
 class DeleteTeamView(LoginRequiredMixin, DeleteView):
     """Allow users to delete teams in team detail"""
@@ -631,7 +828,6 @@ class DeleteTeamView(LoginRequiredMixin, DeleteView):
         return reverse_lazy('team_list')
 
     def get_object(self, queryset=None):
-        team_name = self.kwargs['team_name']
-        return get_object_or_404(Team, team_name=team_name)
+        return get_object_or_404(Team, slug=self.kwargs['slug'])
 
 